@@ -4,3 +4,36 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from rest_framework.authtoken.models import Token
+
+        from recipes.models import Ingredient, Recipe, RecipeIngredient
+        from users.models import User
+        from .authentication import forget_token, forget_user_tokens
+        from .catalog import schedule_rebuild
+        from .ingredient_index import schedule_index_update
+        from .response_cache import (
+            purge_ingredient,
+            purge_recipe,
+            purge_recipe_ingredient,
+            purge_user
+        )
+
+        post_save.connect(schedule_rebuild, sender=Ingredient)
+        post_delete.connect(schedule_rebuild, sender=Ingredient)
+        for model in (Recipe, RecipeIngredient):
+            post_save.connect(schedule_index_update, sender=model)
+            post_delete.connect(schedule_index_update, sender=model)
+        post_delete.connect(forget_token, sender=Token)
+        post_save.connect(forget_user_tokens, sender=User)
+        post_delete.connect(forget_user_tokens, sender=User)
+        for model, receiver in (
+            (Recipe, purge_recipe),
+            (RecipeIngredient, purge_recipe_ingredient),
+            (Ingredient, purge_ingredient),
+            (User, purge_user),
+        ):
+            post_save.connect(receiver, sender=model)
+            post_delete.connect(receiver, sender=model)
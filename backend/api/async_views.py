@@ -0,0 +1,111 @@
+"""Асинхронный путь чтения для запуска под ASGI.
+
+Маршруты роутера, у чьего действия на GET есть асинхронная пара
+(`list` → `alist`), получают асинхронное представление. GET и HEAD
+проходят аутентификацию, проверку прав и само действие в цикле событий:
+запросы к базе идут через асинхронный ORM, а в поток уходят только
+сериализация, фильтры и промахи кэша токенов. Остальные методы
+выполняются исходным синхронным представлением, как и под WSGI.
+
+Одновременно обрабатывается не больше `ASYNC_READ_CONCURRENCY` запросов
+на процесс: иначе тысяча медленных соединений превратилась бы в тысячу
+потоков и соединений с базой.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.urls import URLPattern
+from rest_framework.exceptions import APIException
+
+from .constants import ASYNC_READ_CONCURRENCY
+
+READ_METHODS = ('GET', 'HEAD')
+
+request_slots = asyncio.Semaphore(ASYNC_READ_CONCURRENCY)
+
+
+def async_action(callback):
+    actions = getattr(callback, 'actions', None)
+    if not actions or 'get' not in actions:
+        return None
+    return getattr(callback.cls, f'a{actions["get"]}', None)
+
+
+async def authenticate(request):
+    """Асинхронный аналог `Request._authenticate` из DRF."""
+    for authenticator in request.authenticators:
+        aauthenticate = getattr(authenticator, 'aauthenticate', None)
+        try:
+            if aauthenticate is not None:
+                user_auth = await aauthenticate(request)
+            else:
+                user_auth = await sync_to_async(authenticator.authenticate)(
+                    request
+                )
+        except APIException:
+            request._not_authenticated()
+            raise
+        if user_auth is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = user_auth
+            return
+    request._not_authenticated()
+
+
+async def dispatch(view, request, args, kwargs):
+    """То же, что `APIView.dispatch`, но действие ожидается."""
+    view.args = args
+    view.kwargs = kwargs
+    request = view.initialize_request(request, *args, **kwargs)
+    view.request = request
+    view.headers = view.default_response_headers
+    try:
+        await authenticate(request)
+        # Пользователь уже известен, поэтому права и троттлинг
+        # проверяются без обращений к базе.
+        view.initial(request, *args, **kwargs)
+        handler = getattr(view, f'a{view.action}')
+        response = await handler(request, *args, **kwargs)
+    except Exception as exc:
+        response = view.handle_exception(exc)
+    view.response = view.finalize_response(
+        request, response, *args, **kwargs
+    )
+    return view.response
+
+
+def async_read_view(callback):
+    viewset = callback.cls
+    actions = {**callback.actions, 'head': callback.actions['get']}
+    sync_view = sync_to_async(callback)
+
+    async def view(request, *args, **kwargs):
+        async with request_slots:
+            if request.method not in READ_METHODS:
+                return await sync_view(request, *args, **kwargs)
+            instance = viewset(**callback.initkwargs)
+            instance.action_map = actions
+            for method, action in actions.items():
+                setattr(instance, method, getattr(instance, action))
+            return await dispatch(instance, request, args, kwargs)
+
+    view.cls = viewset
+    view.initkwargs = callback.initkwargs
+    view.actions = callback.actions
+    # csrf_exempt из Django 4.1 не сохраняет асинхронность представления.
+    view.csrf_exempt = True
+    return view
+
+
+def async_read_urls(urls):
+    return [
+        URLPattern(
+            url.pattern,
+            async_read_view(url.callback),
+            url.default_args,
+            url.name
+        )
+        if isinstance(url, URLPattern) and async_action(url.callback)
+        else url
+        for url in urls
+    ]
@@ -0,0 +1,133 @@
+"""Аутентификация по токену с кэшем «токен → пользователь».
+
+Первый запрос с токеном идёт в базу как обычно, дальше пользователь и
+токен берутся из LRU процесса, а при настроенном `TOKEN_AUTH_CACHE` — ещё
+и из общего кэша Django. Записи сбрасываются сигналами при удалении
+токена (выход через djoser), сохранении и удалении пользователя. Другие
+процессы узнают об этом по истечении `TOKEN_AUTH_LOCAL_TTL`, так же
+появляются и правки через `update()`: счётчики, обработанный аватар.
+
+В кэше лежат только значения полей пользователя без хэша пароля. Каждый
+запрос собирает из них новый объект, поэтому изменения пользователя в
+одном запросе не протекают в другие. Пароль у такого объекта отложен:
+`save()` записывает только загруженные поля и пароль не затирает.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header
+)
+from rest_framework.authtoken.models import Token
+
+from .constants import (
+    TOKEN_AUTH_CACHE_SIZE,
+    TOKEN_AUTH_LOCAL_TTL,
+    TOKEN_AUTH_SHARED_TTL
+)
+from .lru import MISSING, LRUCache
+
+User = get_user_model()
+
+USER_FIELDS = tuple(
+    field for field in User._meta.concrete_fields
+    if field.attname != 'password'
+)
+USER_FIELD_NAMES = tuple(field.attname for field in USER_FIELDS)
+
+token_cache = LRUCache(TOKEN_AUTH_CACHE_SIZE)
+
+
+def shared_cache():
+    alias = settings.TOKEN_AUTH_CACHE
+    return caches[alias] if alias else None
+
+
+def shared_key(key):
+    # Сам токен в общий кэш не попадает.
+    return f'auth:token:v2:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def forget_tokens(keys):
+    keys = list(keys)
+    for key in keys:
+        token_cache.delete(key)
+    shared = shared_cache()
+    if shared is not None and keys:
+        shared.delete_many([shared_key(key) for key in keys])
+
+
+def forget_token(sender, instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+def forget_user_tokens(sender, instance, **kwargs):
+    forget_tokens(
+        Token.objects.filter(user_id=instance.pk).values_list(
+            'key', flat=True
+        )
+    )
+
+
+def pack(credentials):
+    user, token = credentials
+    # Значения столбцов, а не атрибуты: файл аватара ссылается на
+    # исходный объект пользователя вместе с хэшем пароля.
+    return tuple(
+        field.get_prep_value(field.value_from_object(user))
+        for field in USER_FIELDS
+    ), token.created
+
+
+def unpack(key, cached):
+    values, created = cached
+    user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELD_NAMES, values)
+    token = Token.from_db(
+        DEFAULT_DB_ALIAS, ('key', 'user_id', 'created'),
+        (key, user.pk, created)
+    )
+    token.user = user
+    return user, token
+
+
+def local_credentials(key):
+    cached = token_cache.get(key)
+    if cached is MISSING:
+        return None
+    return unpack(key, cached)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        credentials = local_credentials(key)
+        if credentials is not None:
+            return credentials
+        shared = shared_cache()
+        cached = None if shared is None else shared.get(shared_key(key))
+        if cached is None:
+            cached = pack(super().authenticate_credentials(key))
+            if shared is not None:
+                shared.set(
+                    shared_key(key), cached, timeout=TOKEN_AUTH_SHARED_TTL
+                )
+        token_cache.set(key, cached, TOKEN_AUTH_LOCAL_TTL)
+        return unpack(key, cached)
+
+    async def aauthenticate(self, request):
+        """Асинхронный `authenticate`: в поток уходит только промах LRU."""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 2:
+            try:
+                credentials = local_credentials(auth[1].decode())
+            except UnicodeError:
+                credentials = None
+            if credentials is not None:
+                return credentials
+        return await sync_to_async(self.authenticate)(request)
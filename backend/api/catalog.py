@@ -0,0 +1,164 @@
+"""Неизменяемый снимок каталога ингредиентов в файле, отображаемом в память.
+
+Файл строится из базы целиком и подменяется атомарно, поэтому все
+процессы gunicorn читают одни и те же страницы памяти и замечают новую
+версию по `os.stat`, не обращаясь к базе.
+
+Формат: заголовок, готовый JSON всего списка в порядке API, границы
+каждого объекта внутри этого JSON, а также отсортированные названия в
+нижнем регистре с перестановкой в номера объектов для поиска по префиксу.
+"""
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+
+from django.conf import settings
+from django.db import transaction
+
+from recipes.models import Ingredient
+
+MAGIC = b'FGIC'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sII7Q')
+UPPER_BOUND = b'\xff'
+
+_catalog = None
+
+
+def encode(item):
+    return json.dumps(
+        item, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def write_catalog(path):
+    items = Ingredient.objects.order_by('name', 'id').values_list(
+        'id', 'name', 'measurement_unit'
+    )
+    body = bytearray(b'[')
+    starts, ends, keys = array('Q'), array('Q'), []
+    for index, (pk, name, unit) in enumerate(items.iterator()):
+        if index:
+            body += b','
+        starts.append(len(body))
+        body += encode({'id': pk, 'name': name, 'measurement_unit': unit})
+        ends.append(len(body))
+        keys.append((name.lower().encode('utf-8'), index))
+    body += b']'
+
+    keys.sort()
+    order = array('I', (index for _, index in keys))
+    key_blob = b''.join(key for key, _ in keys)
+    key_offsets = array('Q', [0])
+    for key, _ in keys:
+        key_offsets.append(key_offsets[-1] + len(key))
+
+    sections = [
+        bytes(body), starts.tobytes(), ends.tobytes(),
+        key_blob, key_offsets.tobytes(), order.tobytes()
+    ]
+    offset = HEADER.size
+    offsets = []
+    for section in sections:
+        offsets.append(offset)
+        offset += len(section)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(HEADER.pack(
+                MAGIC, FORMAT_VERSION, len(order), len(body), *offsets
+            ))
+            for section in sections:
+                file.write(section)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class IngredientCatalog:
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            self.version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self.buffer = mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        (
+            magic, version, count, body_length, body, starts, ends,
+            keys, key_offsets, order
+        ) = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('Неизвестный формат снимка каталога')
+        view = memoryview(self.buffer)
+        self.count = count
+        self.body = view[body:body + body_length]
+        self.starts = view[starts:starts + count * 8].cast('Q')
+        self.ends = view[ends:ends + count * 8].cast('Q')
+        self.keys = view[keys:key_offsets]
+        self.key_offsets = view[
+            key_offsets:key_offsets + (count + 1) * 8
+        ].cast('Q')
+        self.order = view[order:order + count * 4].cast('I')
+
+    def key(self, position):
+        return bytes(self.keys[
+            self.key_offsets[position]:self.key_offsets[position + 1]
+        ])
+
+    def bisect(self, value):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(middle) < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def all(self):
+        return bytes(self.body)
+
+    def search(self, prefix, limit):
+        prefix = prefix.lower().encode('utf-8')
+        low = self.bisect(prefix)
+        high = self.bisect(prefix + UPPER_BOUND)
+        found = sorted(self.order[low:high])[:limit]
+        return b'[' + b','.join(
+            self.body[self.starts[index]:self.ends[index]]
+            for index in found
+        ) + b']', len(found)
+
+
+def get_catalog():
+    global _catalog
+    path = settings.INGREDIENT_CATALOG_PATH
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        write_catalog(path)
+        stat = os.stat(path)
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _catalog is None or _catalog.version != version:
+        _catalog = IngredientCatalog(path)
+    return _catalog
+
+
+def rebuild_catalog():
+    write_catalog(settings.INGREDIENT_CATALOG_PATH)
+
+
+def schedule_rebuild(**kwargs):
+    connection = transaction.get_connection()
+    if not any(
+        callback[1] is rebuild_catalog
+        for callback in connection.run_on_commit
+    ):
+        transaction.on_commit(rebuild_catalog)
@@ -0,0 +1,65 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import (
+    get_conditional_response,
+    patch_vary_headers,
+    quote_etag
+)
+from django.utils.http import http_date
+
+
+def make_etag(*state):
+    return quote_etag(hashlib.sha1(repr(state).encode()).hexdigest())
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на условные GET до работы сериализаторов.
+
+    Представление передаёт дешёвое «состояние» ресурса, из которого
+    строится ETag. Last-Modified отдаётся только анонимам: ответ
+    авторизованному пользователю зависит и от его собственных действий
+    (избранное, корзина, подписки), которые не меняют дату ресурса.
+    """
+
+    def conditional_response(self, state, render, last_modified=None):
+        etag, timestamp, response = self.check_conditional(
+            state, last_modified
+        )
+        if response is None:
+            response = render()
+        return self.add_conditional_headers(response, etag, timestamp)
+
+    async def aconditional_response(
+        self, state, render, last_modified=None
+    ):
+        # Сериализаторы и кэш фрагментов синхронные, поэтому `render`
+        # выполняется в потоке.
+        etag, timestamp, response = self.check_conditional(
+            state, last_modified
+        )
+        if response is None:
+            response = await sync_to_async(render)()
+        return self.add_conditional_headers(response, etag, timestamp)
+
+    def check_conditional(self, state, last_modified):
+        request = self.request
+        etag = make_etag(
+            type(self).__name__, self.action, request.get_full_path(), state
+        )
+        if request.user.is_authenticated or last_modified is None:
+            timestamp = None
+        else:
+            timestamp = int(last_modified.timestamp())
+        return etag, timestamp, get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+
+    @staticmethod
+    def add_conditional_headers(response, etag, timestamp):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        patch_vary_headers(response, ('Authorization',))
+        return response
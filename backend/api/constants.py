@@ -1,4 +1,53 @@
 PAGINATION_PAGE_SIZE = 6
 PAGINATION_PAGE_SIZE_QUERY_PARAM = 'limit'
+PAGINATION_CURSOR_QUERY_PARAM = 'cursor'
+PAGINATION_KEYSET_ORDERING = ('id',)
 
 MIN_AMOUNT = 1
+
+FRAGMENT_CACHE_VERSION = 2
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+INGREDIENT_SEARCH_LIMIT = 20
+INGREDIENT_FUZZY_MIN_LENGTH = 3
+
+INGREDIENT_INDEX_SYNC_INTERVAL = 5
+INGREDIENT_INDEX_SYNC_OVERLAP = 60
+INGREDIENT_INDEX_REBUILD_INTERVAL = 60 * 60
+# Больше найденных рецептов фильтр отдаёт базе, а не списком pk__in.
+INGREDIENT_INDEX_MAX_IDS = 1_000
+
+SHOPPING_LIST_CHUNK_SIZE = 2_000
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+SHOPPING_LIST_CACHE_MAX_SIZE = 1024 * 1024
+SHOPPING_LIST_PDF_FONT_SIZE = 12
+SHOPPING_LIST_PDF_MARGIN = 50
+
+BULK_LINKS_MAX_IDS = 500
+
+IMAGE_SIZE_QUERY_PARAM = 'image_size'
+IMAGE_SIZE_ORIGINAL = 'original'
+IMAGE_SIZE_LIST_DEFAULT = 'card'
+IMAGE_SIZE_SHORT_DEFAULT = 'thumbnail'
+
+SHORT_CODE_ALPHABET = (
+    '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+)
+# Взаимно просто с 62 ** 6: соседние рецепты получают непохожие коды.
+SHORT_CODE_MULTIPLIER = 2_654_435_761
+SHORT_LINK_CACHE_SIZE = 10_000
+SHORT_LINK_CACHE_TTL = 60 * 60
+SHORT_LINK_NEGATIVE_TTL = 5
+SHORT_LINK_FLUSH_INTERVAL = 10
+
+TOKEN_AUTH_CACHE_SIZE = 10_000
+TOKEN_AUTH_LOCAL_TTL = 30
+TOKEN_AUTH_SHARED_TTL = 60
+
+RESPONSE_CACHE_TIMEOUT = 5 * 60
+RESPONSE_CACHE_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Vary')
+
+# Django выполняет синхронный код каждого ASGI-запроса в отдельном потоке
+# со своим соединением с базой; столько запросов на процесс работают
+# одновременно, остальные ждут в цикле событий.
+ASYNC_READ_CONCURRENCY = 16
@@ -1,24 +1,88 @@
+from functools import reduce
+from operator import and_, or_
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity
+)
+from django.db import connection
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Value,
+    When
+)
+from django.db.models.functions import Lower
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe
+from recipes.constants import SEARCH_CONFIGS
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from .ingredient_index import get_recipe_ingredient_index
+from .constants import (
+    INGREDIENT_FUZZY_MIN_LENGTH,
+    INGREDIENT_INDEX_MAX_IDS,
+    INGREDIENT_SEARCH_LIMIT
+)
 
 
 class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
-    )
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    @staticmethod
+    def is_fuzzy(value):
+        return (
+            connection.vendor == 'postgresql'
+            and len(value) >= INGREDIENT_FUZZY_MIN_LENGTH
+        )
+
+    def filter_name(self, queryset, name, value):
+        value = value.strip().lower()
+        if not value:
+            return queryset
+        if connection.vendor != 'postgresql':
+            return queryset.filter(
+                name__istartswith=value
+            )[:INGREDIENT_SEARCH_LIMIT]
+
+        queryset = queryset.annotate(lower_name=Lower('name'))
+        if not self.is_fuzzy(value):
+            return queryset.filter(
+                lower_name__startswith=value
+            ).order_by('name')[:INGREDIENT_SEARCH_LIMIT]
+        return queryset.filter(
+            Q(lower_name__startswith=value)
+            | Q(lower_name__trigram_similar=value)
+        ).annotate(
+            rank=Case(
+                When(lower_name__startswith=value, then=Value(2.0)),
+                default=TrigramSimilarity('lower_name', value),
+                output_field=FloatField()
+            )
+        ).order_by('-rank', 'name')[:INGREDIENT_SEARCH_LIMIT]
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
 
 class RecipeFilter(filters.FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ingredients_all = NumberInFilter(method='filter_ingredients')
+    ingredients_any = NumberInFilter(method='filter_ingredients')
+    pantry = NumberInFilter(method='filter_ingredients')
 
     class Meta:
         model = Recipe
@@ -38,3 +102,51 @@ class RecipeFilter(filters.FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(cart__user=user)
         return queryset
+
+    def filter_ingredients(self, queryset, name, value):
+        if not value:
+            return queryset
+        ingredient_ids = {int(pk) for pk in value}
+        index = get_recipe_ingredient_index()
+        lookup = {
+            'ingredients_all': index.with_all,
+            'ingredients_any': index.with_any,
+            'pantry': index.cookable_from,
+        }[name]
+        recipe_ids = lookup(ingredient_ids)
+        if len(recipe_ids) <= INGREDIENT_INDEX_MAX_IDS:
+            return queryset.filter(pk__in=recipe_ids)
+        return queryset.filter(
+            self.ingredients_condition(name, ingredient_ids)
+        )
+
+    @staticmethod
+    def ingredients_condition(name, ingredient_ids):
+        used = RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+        if name == 'ingredients_all':
+            return reduce(and_, (
+                Exists(used.filter(ingredient_id=pk))
+                for pk in ingredient_ids
+            ))
+        condition = Exists(used.filter(ingredient_id__in=ingredient_ids))
+        if name == 'pantry':
+            condition &= ~Exists(
+                used.exclude(ingredient_id__in=ingredient_ids)
+            )
+        return condition
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        if connection.vendor != 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            )
+        query = reduce(or_, (
+            SearchQuery(value, config=config, search_type='websearch')
+            for config in SEARCH_CONFIGS
+        ))
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', 'id')
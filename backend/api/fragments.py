@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+
+from recipes.models import RecipeIngredient
+from .constants import FRAGMENT_CACHE_TIMEOUT, FRAGMENT_CACHE_VERSION
+
+RECIPE_FRAGMENT_KEY = 'fragment:recipe:{pk}:{version}'
+AUTHOR_FRAGMENT_KEY = 'fragment:author:{pk}:{version}'
+
+
+def version_of(obj):
+    return int(obj.updated_at.timestamp() * 1_000_000)
+
+
+def recipe_fragment_key(recipe):
+    return RECIPE_FRAGMENT_KEY.format(pk=recipe.pk, version=version_of(recipe))
+
+
+def author_fragment_key(author):
+    return AUTHOR_FRAGMENT_KEY.format(pk=author.pk, version=version_of(author))
+
+
+def build_recipe_fragment(recipe):
+    return {
+        'id': recipe.pk,
+        'name': recipe.name,
+        'image': recipe.image.url if recipe.image else None,
+        'image_variants': recipe.image_variants,
+        'ingredients': [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount
+            }
+            for item in recipe.recipe_ingredients.all()
+        ],
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+    }
+
+
+def build_author_fragment(author):
+    return {
+        'id': author.pk,
+        'email': author.email,
+        'username': author.username,
+        'first_name': author.first_name,
+        'last_name': author.last_name,
+        'avatar': author.avatar.url if author.avatar else None,
+    }
+
+
+def _prefetch_ingredients(recipes):
+    prefetch_related_objects(recipes, Prefetch(
+        'recipe_ingredients',
+        queryset=RecipeIngredient.objects.select_related('ingredient')
+    ))
+
+
+def _load(objects, key_func, build, prepare=None):
+    keys = {key_func(obj): obj for obj in objects}
+    fragments = cache.get_many(list(keys), version=FRAGMENT_CACHE_VERSION)
+    missing = [key for key in keys if key not in fragments]
+    if missing:
+        if prepare is not None:
+            prepare([keys[key] for key in missing])
+        built = {key: build(keys[key]) for key in missing}
+        cache.set_many(
+            built,
+            timeout=FRAGMENT_CACHE_TIMEOUT,
+            version=FRAGMENT_CACHE_VERSION
+        )
+        fragments.update(built)
+    return {keys[key].pk: fragment for key, fragment in fragments.items()}
+
+
+def load_recipe_fragments(recipes):
+    """Возвращает общие для всех зрителей части рецептов и их авторов.
+
+    Ключ включает время изменения объекта, поэтому правка рецепта или
+    профиля автора сама делает старый фрагмент недостижимым. Ингредиенты
+    подгружаются одним запросом только для рецептов, которых нет в кэше.
+    """
+    recipes = [recipe for recipe in recipes if recipe.pk is not None]
+    recipe_fragments = _load(
+        recipes, recipe_fragment_key, build_recipe_fragment,
+        prepare=_prefetch_ingredients
+    )
+    authors = {recipe.author_id: recipe.author for recipe in recipes}
+    author_fragments = _load(
+        authors.values(), author_fragment_key, build_author_fragment
+    )
+    return recipe_fragments, author_fragments
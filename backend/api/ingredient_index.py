@@ -0,0 +1,179 @@
+"""Инвертированный индекс «ингредиент → рецепты» в памяти процесса.
+
+Индекс строится один раз и дальше обновляется двумя путями. Записи
+рецептов в этом процессе применяются сигналами после коммита транзакции.
+Записи других процессов и массовые вставки догоняются по
+`Recipe.updated_at` не чаще раза в `INGREDIENT_INDEX_SYNC_INTERVAL`
+секунд. Рецепты, удалённые в других процессах, уходят при периодической
+полной пересборке, а до неё их отсекает итоговый запрос к базе.
+
+Состояние индекса — пара словарей с неизменяемыми множествами. Запись
+собирает новую пару и подменяет её одним присваиванием под блокировкой,
+поэтому читатели работают со своим снимком без блокировки.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import Recipe, RecipeIngredient
+from .constants import (
+    INGREDIENT_INDEX_REBUILD_INTERVAL,
+    INGREDIENT_INDEX_SYNC_INTERVAL,
+    INGREDIENT_INDEX_SYNC_OVERLAP
+)
+
+
+def load_ingredients(recipe_ids):
+    ingredients = {recipe_id: set() for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id').order_by():
+        ingredients[recipe_id].add(ingredient_id)
+    return {
+        recipe_id: frozenset(items)
+        for recipe_id, items in ingredients.items()
+    }
+
+
+class RecipeIngredientIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        # (рецепт → ингредиенты, ингредиент → рецепты); не изменяется.
+        self.snapshot = ({}, {})
+        self.synced_at = None
+        self.checked_at = None
+        self.built_at = None
+
+    def rebuild(self):
+        started = timezone.now()
+        recipes = defaultdict(set)
+        postings = defaultdict(set)
+        pairs = RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by()
+        for recipe_id, ingredient_id in pairs.iterator(chunk_size=10_000):
+            recipes[recipe_id].add(ingredient_id)
+            postings[ingredient_id].add(recipe_id)
+        self.snapshot = (
+            {pk: frozenset(items) for pk, items in recipes.items()},
+            {pk: frozenset(items) for pk, items in postings.items()}
+        )
+        self.synced_at = started
+        self.built_at = time.monotonic()
+
+    def sync(self):
+        started = timezone.now()
+        changed = list(Recipe.objects.filter(
+            updated_at__gte=self.synced_at - timedelta(
+                seconds=INGREDIENT_INDEX_SYNC_OVERLAP
+            )
+        ).values_list('id', flat=True).order_by())
+        if changed:
+            self.replace(load_ingredients(changed))
+        self.synced_at = started
+
+    def replace(self, fresh):
+        """Подменяет наборы ингредиентов рецептов; пустой — удаление."""
+        recipes, postings = self.snapshot
+        recipes, postings = dict(recipes), dict(postings)
+        removed, added = defaultdict(set), defaultdict(set)
+        for recipe_id, ingredients in fresh.items():
+            old = recipes.pop(recipe_id, frozenset())
+            if ingredients:
+                recipes[recipe_id] = ingredients
+            for ingredient_id in old - ingredients:
+                removed[ingredient_id].add(recipe_id)
+            for ingredient_id in ingredients - old:
+                added[ingredient_id].add(recipe_id)
+        for ingredient_id in removed.keys() | added.keys():
+            postings[ingredient_id] = (
+                postings.get(ingredient_id, frozenset())
+                - removed[ingredient_id]
+            ) | added[ingredient_id]
+        self.snapshot = (recipes, postings)
+
+    def refresh(self):
+        if self.checked_at is not None and (
+            time.monotonic() - self.checked_at
+            < INGREDIENT_INDEX_SYNC_INTERVAL
+        ):
+            return
+        with self.lock:
+            now = time.monotonic()
+            if self.built_at is None or (
+                now - self.built_at > INGREDIENT_INDEX_REBUILD_INTERVAL
+            ):
+                self.rebuild()
+            elif now - self.checked_at >= INGREDIENT_INDEX_SYNC_INTERVAL:
+                self.sync()
+            self.checked_at = now
+
+    def schedule(self, recipe_id):
+        """Запоминает изменённый рецепт до коммита текущей транзакции."""
+        if self.built_at is None:
+            return
+        connection = transaction.get_connection()
+        registered = any(
+            callback[1] == self.apply_scheduled
+            for callback in connection.run_on_commit
+        )
+        if not registered:
+            self.local.scheduled = set()
+        self.local.scheduled.add(recipe_id)
+        if not registered:
+            transaction.on_commit(self.apply_scheduled)
+
+    def apply_scheduled(self):
+        scheduled, self.local.scheduled = self.local.scheduled, set()
+        fresh = load_ingredients(scheduled)
+        with self.lock:
+            self.replace(fresh)
+
+    def posting_lists(self, postings, ingredient_ids):
+        return sorted(
+            (postings.get(pk, frozenset()) for pk in set(ingredient_ids)),
+            key=len
+        )
+
+    def with_all(self, ingredient_ids):
+        _, postings = self.snapshot
+        postings = self.posting_lists(postings, ingredient_ids)
+        if not postings:
+            return set()
+        return set(postings[0]).intersection(*postings[1:])
+
+    def with_any(self, ingredient_ids):
+        _, postings = self.snapshot
+        return set().union(*self.posting_lists(postings, ingredient_ids))
+
+    def cookable_from(self, ingredient_ids):
+        recipes, postings = self.snapshot
+        pantry = frozenset(ingredient_ids)
+        return {
+            recipe_id
+            for recipe_id in set().union(
+                *self.posting_lists(postings, pantry)
+            )
+            if recipes[recipe_id] <= pantry
+        }
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
+
+
+def get_recipe_ingredient_index():
+    recipe_ingredient_index.refresh()
+    return recipe_ingredient_index
+
+
+def schedule_index_update(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    recipe_ingredient_index.schedule(
+        instance.pk if sender is Recipe else instance.recipe_id
+    )
@@ -0,0 +1,83 @@
+"""Пакетная загрузка связей текущего пользователя на время запроса.
+
+Сериализатор списка сначала сообщает загрузчику все ключи страницы
+(`prime`), а первый `load` получает их одним запросом `IN`. Ответы
+запоминаются на объекте запроса, поэтому вложенные сериализаторы и
+повторные обращения в том же запросе базу уже не трогают.
+"""
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Subscription
+
+
+class Loader:
+    def __init__(self, fetch, default=None):
+        self.fetch = fetch
+        self.default = default
+        self.pending = set()
+        self.cache = {}
+
+    def prime(self, keys):
+        self.pending.update(key for key in keys if key not in self.cache)
+
+    def load(self, key):
+        if key not in self.cache:
+            self.pending.add(key)
+            keys, self.pending = self.pending, set()
+            found = self.fetch(keys)
+            for pending_key in keys:
+                self.cache[pending_key] = found.get(
+                    pending_key, self.default
+                )
+        return self.cache[key]
+
+
+class RequestLoaders:
+    def __init__(self, user):
+        self.user = user
+        self.loaders = {}
+
+    def get(self, name, fetch, default=None):
+        if name not in self.loaders:
+            self.loaders[name] = Loader(fetch, default)
+        return self.loaders[name]
+
+    def relation(self, model, owner_field, target_field):
+        def fetch(keys):
+            if self.user is None or not self.user.is_authenticated:
+                return {}
+            return dict.fromkeys(model.objects.filter(**{
+                owner_field: self.user, f'{target_field}__in': keys
+            }).values_list(target_field, flat=True), True)
+
+        return self.get(model._meta.label, fetch, default=False)
+
+    @property
+    def is_subscribed(self):
+        return self.relation(Subscription, 'subscriber', 'author_id')
+
+    @property
+    def is_favorited(self):
+        return self.relation(Favorite, 'user', 'recipe_id')
+
+    @property
+    def is_in_shopping_cart(self):
+        return self.relation(Cart, 'user', 'recipe_id')
+
+    def latest_recipes(self, limit):
+        def fetch(keys):
+            recipes = {}
+            for recipe in Recipe.objects.latest_by_author(keys, limit):
+                recipes.setdefault(recipe.author_id, []).append(recipe)
+            return recipes
+
+        return self.get(f'latest_recipes:{limit}', fetch, default=[])
+
+
+def get_loaders(context):
+    request = context.get('request')
+    if request is None:
+        return RequestLoaders(None)
+    loaders = getattr(request, 'loaders', None)
+    if loaders is None:
+        loaders = request.loaders = RequestLoaders(request.user)
+    return loaders
@@ -0,0 +1,72 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.filters import IngredientFilter
+from api.serializers import IngredientSerializer
+from recipes.models import Ingredient
+
+ALPHABET = string.ascii_lowercase + 'абвгдеёжзийклмнопрстуфхцчшщыэюя'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку поиска ингредиентов в базе на синтетическом '
+        'каталоге. Все созданные строки откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=1_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                names = self.fill(rng, options['rows'])
+                timings = self.run(rng, names, options['queries'])
+                raise Rollback
+        except Rollback:
+            pass
+        timings.sort()
+        for label, share in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            value = timings[min(len(timings) - 1, int(len(timings) * share))]
+            self.stdout.write(f'{label}: {value * 1000:.2f} мс')
+
+    def fill(self, rng, rows):
+        names = [
+            ' '.join(
+                ''.join(rng.choices(ALPHABET, k=rng.randint(3, 10)))
+                for _ in range(rng.randint(1, 3))
+            ) + f' {index}'
+            for index in range(rows)
+        ]
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit='г') for name in names),
+            batch_size=5_000
+        )
+        return names
+
+    def run(self, rng, names, queries):
+        timings = []
+        for _ in range(queries):
+            name = rng.choice(names)
+            query = name[:rng.randint(1, min(len(name), 8))]
+            if rng.random() < 0.2 and len(query) > 3:
+                position = rng.randrange(len(query))
+                query = query[:position] + rng.choice(ALPHABET) + query[
+                    position + 1:
+                ]
+            started = time.perf_counter()
+            IngredientSerializer(IngredientFilter(
+                {'name': query}, queryset=Ingredient.objects.all()
+            ).qs, many=True).data
+            timings.append(time.perf_counter() - started)
+        return timings
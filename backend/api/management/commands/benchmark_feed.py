@@ -0,0 +1,125 @@
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.constants import PAGINATION_PAGE_SIZE
+from recipes.constants import FEED_FANOUT_MAX_SUBSCRIBERS
+from recipes.counters import rebuild
+from recipes.feed import feed_recipe_ids
+from recipes.models import Recipe
+from users.models import Subscription, User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет запись и чтение ленты подписок при перекошенном '
+        'распределении подписчиков. Все созданные строки откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5_000)
+        parser.add_argument('--authors', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=5_000)
+        parser.add_argument('--follows', type=int, default=30)
+        parser.add_argument('--skew', type=float, default=1.2)
+        parser.add_argument('--queries', type=int, default=1_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                users, authors = self.fill(rng, options)
+                writes = self.write(rng, authors, options)
+                reads, naive = self.read(rng, users, options['queries'])
+                raise Rollback
+        except Rollback:
+            pass
+        self.report('запись рецепта', writes)
+        self.report('лента, первая страница', reads)
+        self.report('соединение Subscription и Recipe', naive)
+
+    def report(self, label, timings):
+        timings.sort()
+        self.stdout.write(label)
+        for name, share in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            value = timings[min(len(timings) - 1, int(len(timings) * share))]
+            self.stdout.write(f'  {name}: {value * 1000:.2f} мс')
+
+    def fill(self, rng, options):
+        users = User.objects.bulk_create(
+            User(
+                username=f'benchmark-{index}',
+                email=f'benchmark-{index}@example.com',
+                first_name='Бенчмарк',
+                last_name='Бенчмарк'
+            )
+            for index in range(options['users'])
+        )
+        authors = users[:options['authors']]
+        weights = list(itertools.accumulate(
+            1 / rank ** options['skew'] for rank in range(1, len(authors) + 1)
+        ))
+        follows = set()
+        for user in users:
+            count = rng.randint(1, options['follows'] * 2)
+            for author in rng.choices(authors, cum_weights=weights, k=count):
+                if author.pk != user.pk:
+                    follows.add((user.pk, author.pk))
+        Subscription.objects.bulk_create(
+            (
+                Subscription(subscriber_id=user_id, author_id=author_id)
+                for user_id, author_id in follows
+            ),
+            batch_size=5_000
+        )
+        rebuild(User, 'subscribers_count', Subscription, 'author')
+        authors = list(User.objects.filter(
+            pk__in=[author.pk for author in authors]
+        ).order_by('-subscribers_count'))
+        large = sum(
+            author.subscribers_count > FEED_FANOUT_MAX_SUBSCRIBERS
+            for author in authors
+        )
+        self.stdout.write(
+            f'подписок: {len(follows)}, самый крупный автор: '
+            f'{authors[0].subscribers_count}, авторов без раскладки: {large}'
+        )
+        return users, authors
+
+    def write(self, rng, authors, options):
+        timings = []
+        for index in range(options['recipes']):
+            author = rng.choice(authors)
+            started = time.perf_counter()
+            Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {index}',
+                text='Бенчмарк',
+                cooking_time=10,
+                image='recipes/benchmark.png'
+            )
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    def read(self, rng, users, queries):
+        reads, naive = [], []
+        for user in rng.choices(users, k=queries):
+            started = time.perf_counter()
+            list(Recipe.objects.filter(pk__in=feed_recipe_ids(
+                user, limit=PAGINATION_PAGE_SIZE + 1
+            )).order_by('-id'))
+            reads.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            list(Recipe.objects.filter(
+                author__subscribers__subscriber=user
+            ).order_by('-id')[:PAGINATION_PAGE_SIZE + 1])
+            naive.append(time.perf_counter() - started)
+        return reads, naive
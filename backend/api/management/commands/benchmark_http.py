@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает адрес API заданным числом одновременных keep-alive '
+        'соединений и печатает пропускную способность и задержки. '
+        'Запустите против развёртываний на WSGI и на ASGI, чтобы их '
+        'сравнить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url')
+        parser.add_argument('--connections', type=int, default=1_000)
+        parser.add_argument('--requests', type=int, default=20_000)
+        parser.add_argument('--token', default='')
+        parser.add_argument('--timeout', type=float, default=30)
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Нужен адрес вида http://host:port/path')
+        timings, errors, elapsed = asyncio.run(self.run(url, options))
+        self.stdout.write(
+            f'запросов: {len(timings)}, ошибок: {sum(errors.values())}, '
+            f'за {elapsed:.2f} с'
+        )
+        for reason, count in errors.most_common():
+            self.stdout.write(f'  {reason}: {count}')
+        if not timings:
+            return
+        self.stdout.write(f'{len(timings) / elapsed:.0f} запросов/с')
+        timings.sort()
+        for label, share in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+            value = timings[min(len(timings) - 1, int(len(timings) * share))]
+            self.stdout.write(f'{label}: {value * 1000:.2f} мс')
+
+    async def run(self, url, options):
+        path = url.path or '/'
+        if url.query:
+            path = f'{path}?{url.query}'
+        headers = [
+            f'GET {path} HTTP/1.1',
+            f'Host: {url.netloc}',
+            'Accept: application/json',
+        ]
+        if options['token']:
+            headers.append(f'Authorization: Token {options["token"]}')
+        request = ('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1')
+
+        self.remaining = options['requests']
+        timings = []
+        errors = Counter()
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self.connection(url, request, options['timeout'], timings, errors)
+            for _ in range(options['connections'])
+        ))
+        return timings, errors, time.perf_counter() - started
+
+    async def connection(self, url, request, timeout, timings, errors):
+        writer = None
+        while self.remaining > 0:
+            self.remaining -= 1
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(
+                        url.hostname, url.port or 80
+                    )
+                status, keep_alive = await asyncio.wait_for(
+                    self.fetch(reader, writer, request), timeout
+                )
+            except (OSError, ValueError, asyncio.TimeoutError,
+                    asyncio.IncompleteReadError) as error:
+                errors[type(error).__name__] += 1
+                writer = await self.close(writer)
+                continue
+            timings.append(time.perf_counter() - started)
+            if status != 200:
+                errors[f'HTTP {status}'] += 1
+            if not keep_alive:
+                writer = await self.close(writer)
+        await self.close(writer)
+
+    @staticmethod
+    async def close(writer):
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    @staticmethod
+    async def fetch(reader, writer, request):
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b'', None)
+        version, status = status_line.split()[:2]
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+        if headers.get('transfer-encoding') == 'chunked':
+            while size := int((await reader.readline()).split(b';')[0], 16):
+                await reader.readexactly(size + 2)
+            await reader.readline()
+        else:
+            await reader.readexactly(int(headers.get('content-length', 0)))
+        keep_alive = headers.get('connection', (
+            'keep-alive' if version == b'HTTP/1.1' else 'close'
+        )) != 'close'
+        return int(status), keep_alive
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.catalog import IngredientCatalog, rebuild_catalog
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает снимок каталога ингредиентов'
+
+    def handle(self, *args, **options):
+        rebuild_catalog()
+        catalog = IngredientCatalog(settings.INGREDIENT_CATALOG_PATH)
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок каталога собран: {catalog.count} ингредиентов'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipes.constants import RECIPE_EXPORT_CHUNK_SIZE
+from recipes.dump import export_recipes, open_dump
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает рецепты с авторами и ингредиентами в NDJSON '
+        '(сжимается gzip, если путь оканчивается на .gz)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=RECIPE_EXPORT_CHUNK_SIZE,
+            help='Сколько рецептов читать из базы за один раз'
+        )
+
+    def handle(self, *args, **options):
+        with open_dump(options['path'], 'w') as file:
+            count = export_recipes(file, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Выгружено рецептов: {count}'))
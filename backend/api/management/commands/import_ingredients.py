@@ -0,0 +1,189 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.catalog import rebuild_catalog
+from api.response_cache import purge
+from recipes.constants import (
+    MAX_INGREDIENT_NAME_LENGTH,
+    MAX_MEASUREMENT_UNIT_LENGTH
+)
+from recipes.models import Ingredient
+
+READ_SIZE = 64 * 1024
+STAGING_TABLE = 'ingredient_import'
+
+
+class Rollback(Exception):
+    pass
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1] if len(row) > 1 else ''
+
+
+def read_json(file):
+    """Читает массив объектов или NDJSON по одному объекту за раз."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            position += 1
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                if buffer[position:].strip():
+                    raise CommandError(
+                        'Не удалось разобрать JSON рядом с '
+                        f'«{buffer[position:position + 40]}»'
+                    )
+                return
+            chunk = file.read(READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item.get('name', ''), item.get('measurement_unit', '')
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'jsonl': read_json}
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает ингредиенты из CSV или JSON; уже существующие '
+        'пары (название, единица) пропускаются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Формат файла; по умолчанию определяется по расширению'
+        )
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Выполнить загрузку в транзакции и откатить её'
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(
+            options['path']
+        )[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        self.total = os.path.getsize(options['path'])
+        self.read = self.inserted = self.skipped = 0
+
+        with open(options['path'], 'rb') as self.raw, io.TextIOWrapper(
+            self.raw, encoding='utf-8-sig', newline=''
+        ) as text:
+            rows = self.clean(READERS[file_format](text))
+            if options['dry_run']:
+                try:
+                    with transaction.atomic():
+                        self.load(rows, options['batch_size'])
+                        raise Rollback
+                except Rollback:
+                    pass
+            else:
+                # Каждая пачка фиксируется сама, поэтому при ошибке
+                # загруженное раньше остаётся и попадает в каталог.
+                try:
+                    self.load(rows, options['batch_size'])
+                finally:
+                    if self.inserted:
+                        rebuild_catalog()
+                        purge('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверено" if options["dry_run"] else "Загружено"}: '
+            f'строк {self.read}, новых ингредиентов {self.inserted}, '
+            f'пропущено некорректных {self.skipped}'
+        ))
+
+    def clean(self, rows):
+        for name, unit in rows:
+            self.read += 1
+            name, unit = str(name).strip(), str(unit).strip()
+            if (
+                not name or not unit
+                or len(name) > MAX_INGREDIENT_NAME_LENGTH
+                or len(unit) > MAX_MEASUREMENT_UNIT_LENGTH
+            ):
+                self.skipped += 1
+                continue
+            yield name, unit
+
+    def load(self, rows, batch_size):
+        postgres = connection.vendor == 'postgresql'
+        if postgres:
+            self.create_staging()
+        try:
+            while batch := list(islice(rows, batch_size)):
+                with transaction.atomic():
+                    if postgres:
+                        inserted = self.merge(batch)
+                    else:
+                        inserted = self.insert(batch)
+                self.inserted += inserted
+                self.stdout.write(
+                    f'{self.raw.tell() * 100 // max(self.total, 1)}%: '
+                    f'строк {self.read}, новых {self.inserted}'
+                )
+        finally:
+            # Внутри транзакции (--dry-run) таблица исчезнет при откате.
+            if postgres and not connection.in_atomic_block:
+                self.drop_staging()
+
+    def create_staging(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} '
+                '(name text, measurement_unit text) ON COMMIT DELETE ROWS'
+            )
+
+    def drop_staging(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+
+    def merge(self, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            cursor.execute(
+                f'INSERT INTO {table} '
+                '(name, measurement_unit, updated_at, recipes_count) '
+                'SELECT name, measurement_unit, now(), 0 '
+                f'FROM {STAGING_TABLE} '
+                'ON CONFLICT ON CONSTRAINT unique_ingredient DO NOTHING'
+            )
+            inserted = cursor.rowcount
+            cursor.execute(f'TRUNCATE {STAGING_TABLE}')
+        return inserted
+
+    def insert(self, batch):
+        before = Ingredient.objects.count()
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch),
+            ignore_conflicts=True
+        )
+        return Ingredient.objects.count() - before
@@ -0,0 +1,63 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from api.catalog import rebuild_catalog
+from api.response_cache import purge
+from recipes.constants import RECIPE_IMPORT_BATCH_SIZE
+from recipes.dump import import_recipes, open_dump
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты из NDJSON, выгруженного export_recipes; '
+        'рецепты получают новые id'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECIPE_IMPORT_BATCH_SIZE,
+            help='Сколько рецептов загружать в одной транзакции'
+        )
+        parser.add_argument(
+            '--id-map',
+            help='CSV-файл для пар «старый id, новый id»'
+        )
+
+    def handle(self, *args, **options):
+        imported = created_ingredients = 0
+        id_map = open(
+            options['id_map'], 'w', newline=''
+        ) if options['id_map'] else None
+        try:
+            with open_dump(options['path'], 'r') as file:
+                for pairs, created in import_recipes(
+                    file, options['batch_size']
+                ):
+                    if id_map is not None:
+                        csv.writer(id_map).writerows(pairs)
+                    imported += len(pairs)
+                    created_ingredients += created
+                    self.stdout.write(f'Загружено рецептов: {imported}')
+        except (DatabaseError, KeyError, ValueError) as error:
+            raise CommandError(
+                f'Ошибка в пачке после {imported} загруженных рецептов: '
+                f'{error!r}'
+            )
+        finally:
+            if id_map is not None:
+                id_map.close()
+            if created_ingredients:
+                rebuild_catalog()
+                purge('ingredients')
+            if imported:
+                purge('recipes', 'users')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: рецептов {imported}, новых ингредиентов '
+            f'{created_ingredients}. Уменьшенные копии изображений строит '
+            'build_image_variants'
+        ))
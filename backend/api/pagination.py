@@ -1,11 +1,222 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from .constants import (
+    PAGINATION_CURSOR_QUERY_PARAM,
+    PAGINATION_KEYSET_ORDERING,
     PAGINATION_PAGE_SIZE,
     PAGINATION_PAGE_SIZE_QUERY_PARAM
 )
 
 
+def rows_to_count(queryset):
+    # Аннотации и сортировка не меняют число строк, а Django 4.1 иначе
+    # считает через `SELECT COUNT(*) FROM (...)` и вычисляет подзапросы
+    # `Exists` для каждой строки таблицы.
+    return queryset.values('pk').order_by()
+
+
+class CountingPaginator(DjangoPaginator):
+    @cached_property
+    def count(self):
+        return rows_to_count(self.object_list).count()
+
+
+class KeysetPaginator(CursorPagination):
+    """Пагинация по ключу `(поле сортировки, id)` без COUNT и OFFSET.
+
+    Курсор хранит значения ключа крайней записи страницы, поэтому
+    стоимость любой страницы одинакова. Порядок берётся из атрибута
+    `keyset_ordering` представления; поле с минусом сортируется по
+    убыванию.
+    """
+
+    page_size = PAGINATION_PAGE_SIZE
+    page_size_query_param = PAGINATION_PAGE_SIZE_QUERY_PARAM
+    cursor_query_param = PAGINATION_CURSOR_QUERY_PARAM
+    ordering = PAGINATION_KEYSET_ORDERING
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page([item async for item in queryset])
+
+    def page_queryset(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(
+            getattr(view, 'keyset_ordering', self.ordering)
+        )
+        self.position, self.reverse = self.decode_cursor(request)
+        if self.position is not None:
+            self.position = self.clean_position(
+                queryset.model, self.position
+            )
+
+        queryset = queryset.order_by(*(
+            self.flip(field) if self.reverse else field
+            for field in self.ordering
+        ))
+        if self.position is not None:
+            queryset = queryset.filter(
+                self.after(self.position, self.reverse)
+            )
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        started = self.position is not None
+        if self.reverse:
+            self.page.reverse()
+        self.has_next = has_more if not self.reverse else started
+        self.has_previous = started if not self.reverse else has_more
+        return self.page
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def after(self, position, reverse):
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            descending = field.startswith('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{field.lstrip("-")}__{lookup}': position[index]})
+            for prev_field, prev_value in zip(
+                self.ordering[:index], position[:index]
+            ):
+                step &= Q(**{prev_field.lstrip('-'): prev_value})
+            condition |= step
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            position = data['p']
+            reverse = bool(data.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+            len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def clean_position(self, model, position):
+        """Приводит значения курсора к типам полей сортировки."""
+        cleaned = []
+        for field, value in zip(self.ordering, position):
+            try:
+                if value is None:
+                    raise ValueError
+                cleaned.append(
+                    model._meta.get_field(field.lstrip('-')).to_python(value)
+                )
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def encode_cursor(self, instance, reverse):
+        data = {'p': [
+            getattr(instance, field.lstrip('-')) for field in self.ordering
+        ]}
+        if reverse:
+            data['r'] = 1
+        encoded = urlsafe_b64encode(
+            json.dumps(data, default=str).encode('utf-8')
+        ).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+
+class FeedPaginator(KeysetPaginator):
+    ordering = ('-id',)
+
+
 class Paginator(PageNumberPagination):
+    django_paginator_class = CountingPaginator
     page_size = PAGINATION_PAGE_SIZE
     page_size_query_param = PAGINATION_PAGE_SIZE_QUERY_PARAM
+    cursor_query_param = PAGINATION_CURSOR_QUERY_PARAM
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPaginator()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """То же, что `paginate_queryset`, но через асинхронный ORM."""
+        self.keyset = None
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPaginator()
+            return await self.keyset.apaginate_queryset(
+                queryset, request, view
+            )
+        paginator = self.django_paginator_class(
+            queryset, self.get_page_size(request)
+        )
+        paginator.count = await rows_to_count(queryset).acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        bottom = (number - 1) * paginator.per_page
+        items = [
+            item async for item in
+            queryset[bottom:bottom + paginator.per_page]
+        ]
+        self.page = Page(items, number, paginator)
+        self.request = request
+        return items
+
+    def get_state(self):
+        if self.keyset is not None:
+            return self.keyset.has_next, self.keyset.has_previous
+        return self.page.paginator.count, self.page.number
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
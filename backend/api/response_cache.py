@@ -0,0 +1,228 @@
+"""Кэш готовых ответов для анонимных GET-запросов.
+
+Ключ — схема, хост, путь, отсортированные параметры запроса и формат
+ответа. Каждый ответ помечается тегами (`recipe:<id>`, `author:<id>`,
+`ingredients` и т. п.), а для тега в кэше хранится время последней
+очистки. Запись действительна, только если все её теги существуют и ни
+один не очищался после того, как запись начали строить, поэтому очистка
+тега — одна запись в кэш, а гонка «прочитал старое, сохранил после
+очистки» не оставляет устаревших ответов. Потерянный при вытеснении тег
+просто превращает запись в промах.
+
+Очистка выполняется после фиксации транзакции. Изменения через
+`update()` (варианты изображений, обработка аватара) тегов не очищают и
+видны анонимам не позже `RESPONSE_CACHE_TIMEOUT`.
+"""
+import asyncio
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .constants import RESPONSE_CACHE_HEADERS, RESPONSE_CACHE_TIMEOUT
+
+
+def response_cache():
+    alias = settings.RESPONSE_CACHE
+    return caches[alias] if alias else None
+
+
+def tag_key(tag):
+    return f'response:tag:{tag}'
+
+
+def response_key(request):
+    query = urlencode(sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values if value != ''
+    ))
+    source = (
+        f'{request.scheme}://{request.get_host()}{request.path}?{query}'
+        f'#{request.accepted_renderer.format}'
+    )
+    return f'response:{hashlib.sha1(source.encode()).hexdigest()}'
+
+
+def is_cacheable(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and 'HTTP_AUTHORIZATION' not in request.META
+    )
+
+
+def is_fresh(cache, tags, started):
+    purged = cache.get_many([tag_key(tag) for tag in tags])
+    return len(purged) == len(tags) and all(
+        purged_at < started for purged_at in purged.values()
+    )
+
+
+def store(cache, key, response, tags, started):
+    tags = sorted(set(tags))
+    for tag in tags:
+        cache.add(tag_key(tag), 0, timeout=None)
+    if not is_fresh(cache, tags, started):
+        return
+    cache.set(key, {
+        'started': started,
+        'tags': tags,
+        'content': response.content,
+        'headers': {
+            name: response[name] for name in RESPONSE_CACHE_HEADERS
+            if response.has_header(name)
+        },
+    }, timeout=RESPONSE_CACHE_TIMEOUT)
+
+
+def load(cache, request, key):
+    entry = cache.get(key)
+    if entry is None or not is_fresh(
+        cache, entry['tags'], entry['started']
+    ):
+        return None
+    response = HttpResponse(entry['content'])
+    for name, value in entry['headers'].items():
+        response[name] = value
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified', '')),
+        response=response
+    )
+
+
+def store_after_render(cache, key, response, tags, started):
+    """Откладывает сохранение неотрисованного ответа до рендеринга.
+
+    Для уже готового ответа возвращает функцию, которую вызывающий
+    выполняет сам: синхронно или через `sync_to_async`.
+    """
+    def save(rendered):
+        store(cache, key, rendered, tags, started)
+
+    if getattr(response, 'is_rendered', True):
+        return save
+    response.add_post_render_callback(save)
+    return None
+
+
+def cache_anonymous(get_tags):
+    """Кэширует успешные ответы действия для анонимов.
+
+    `get_tags(response)` возвращает теги ответа; у ответов DRF его
+    данные лежат в `response.data`. Подходит и для асинхронных действий:
+    обращения к кэшу из них идут через `sync_to_async`.
+    """
+    def decorator(method):
+        if asyncio.iscoroutinefunction(method):
+            @wraps(method)
+            async def async_wrapper(self, request, *args, **kwargs):
+                cache = response_cache()
+                if cache is None or not is_cacheable(request):
+                    return await method(self, request, *args, **kwargs)
+                key = response_key(request)
+                cached = await sync_to_async(load)(cache, request, key)
+                if cached is not None:
+                    return cached
+                started = time.time()
+                response = await method(self, request, *args, **kwargs)
+                if response.status_code == 200:
+                    save = store_after_render(
+                        cache, key, response, get_tags(response), started
+                    )
+                    if save is not None:
+                        await sync_to_async(save)(response)
+                return response
+            return async_wrapper
+
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            cache = response_cache()
+            if cache is None or not is_cacheable(request):
+                return method(self, request, *args, **kwargs)
+            key = response_key(request)
+            cached = load(cache, request, key)
+            if cached is not None:
+                return cached
+            started = time.time()
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                save = store_after_render(
+                    cache, key, response, get_tags(response), started
+                )
+                if save is not None:
+                    save(response)
+            return response
+        return wrapper
+    return decorator
+
+
+def purge(*tags):
+    cache = response_cache()
+    if cache is None or not tags:
+        return
+
+    def set_purged():
+        now = time.time()
+        cache.set_many(
+            {tag_key(tag): now for tag in tags}, timeout=None
+        )
+
+    transaction.on_commit(set_purged)
+
+
+def page_items(response):
+    data = response.data
+    return data['results'] if 'results' in data else [data]
+
+
+def recipe_tags(response):
+    tags = []
+    for recipe in page_items(response):
+        tags.append(f'recipe:{recipe["id"]}')
+        tags.append(f'author:{recipe["author"]["id"]}')
+        tags.extend(
+            f'ingredient:{item["id"]}' for item in recipe['ingredients']
+        )
+    return tags
+
+
+def recipe_list_tags(response):
+    return ['recipes', *recipe_tags(response)]
+
+
+def user_tags(response):
+    return [f'author:{user["id"]}' for user in page_items(response)]
+
+
+def user_list_tags(response):
+    return ['users', *user_tags(response)]
+
+
+def ingredient_tags(response):
+    return ['ingredients']
+
+
+def purge_recipe(sender, instance, **kwargs):
+    purge('recipes', f'recipe:{instance.pk}')
+
+
+def purge_recipe_ingredient(sender, instance, **kwargs):
+    purge(f'recipe:{instance.recipe_id}')
+
+
+def purge_ingredient(sender, instance, **kwargs):
+    purge('ingredients', f'ingredient:{instance.pk}')
+
+
+def purge_user(sender, instance, **kwargs):
+    purge('users', f'author:{instance.pk}')
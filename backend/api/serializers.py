@@ -1,3 +1,4 @@
+from django.db import models, transaction
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework.exceptions import ValidationError
@@ -7,35 +8,108 @@ from djoser.serializers import (
 )
 from django.core.validators import MinValueValidator
 
+from recipes.cart_totals import change_recipe_totals, diff_amounts
+from recipes.counters import adjust
 from recipes.models import (
+    CartIngredient,
     Ingredient,
     RecipeIngredient,
     Recipe
 )
-from .constants import MIN_AMOUNT
+from recipes.constants import IMAGE_VARIANT_WIDTHS
+from recipes.images import image_srcset, variant_url
+from .constants import (
+    BULK_LINKS_MAX_IDS,
+    IMAGE_SIZE_LIST_DEFAULT,
+    IMAGE_SIZE_ORIGINAL,
+    IMAGE_SIZE_QUERY_PARAM,
+    IMAGE_SIZE_SHORT_DEFAULT,
+    MIN_AMOUNT
+)
+from .fragments import load_recipe_fragments
+from .loaders import get_loaders
 
 User = get_user_model()
 
 
+class ImageVariantsMixin:
+    """Ссылка на нужный размер изображения и `srcset` по всем вариантам.
+
+    Размер можно выбрать параметром `image_size`; без него списки
+    получают уменьшенную копию, а отдельный объект — исходный файл.
+    """
+
+    default_image_size = IMAGE_SIZE_ORIGINAL
+    list_image_size = IMAGE_SIZE_LIST_DEFAULT
+
+    def build_url(self, url):
+        request = self.context.get('request')
+        if url and request:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_image_size(self):
+        request = self.context.get('request')
+        size = request.query_params.get(
+            IMAGE_SIZE_QUERY_PARAM
+        ) if request else None
+        if size in IMAGE_VARIANT_WIDTHS or size == IMAGE_SIZE_ORIGINAL:
+            return size
+        if isinstance(self.parent, serializers.ListSerializer):
+            return self.list_image_size
+        return self.default_image_size
+
+    def image_fields(self, original, variants):
+        return {
+            'image': self.build_url(
+                variant_url(variants, self.get_image_size()) or original
+            ),
+            'image_srcset': image_srcset(variants, self.build_url),
+        }
+
+    def get_image(self, obj):
+        return self.image_fields(
+            obj.image.url if obj.image else None, obj.image_variants
+        )['image']
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image_variants, self.build_url)
+
+
+class PrimingListSerializer(serializers.ListSerializer):
+    """Передаёт дочернему сериализатору всю страницу перед обходом."""
+
+    def to_representation(self, data):
+        items = list(
+            data.all() if isinstance(data, models.Manager) else data
+        )
+        self.child.prime(items)
+        return super().to_representation(items)
+
+
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False, allow_null=True)
 
     class Meta:
         model = User
+        list_serializer_class = PrimingListSerializer
         fields = (
             'id', 'email', 'username', 'first_name',
             'last_name', 'is_subscribed', 'avatar'
         )
         read_only_fields = ('id', 'is_subscribed')
 
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        return (
-            request.user.is_authenticated
-            and obj.subscribers.filter(subscriber=request.user).exists()
+    def prime(self, users):
+        get_loaders(self.context).is_subscribed.prime(
+            user.pk for user in users if not hasattr(user, 'is_subscribed')
         )
 
+    def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return get_loaders(self.context).is_subscribed.load(obj.pk)
+
 
 class UserCreateSerializer(DjoserUserCreateSerializer):
     class Meta(DjoserUserCreateSerializer.Meta):
@@ -71,9 +145,8 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    # Существование проверяет RecipeWriteSerializer сразу для всех id.
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         validators=[MinValueValidator(MIN_AMOUNT)]
     )
@@ -97,7 +170,22 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class CartIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+    amount = serializers.ReadOnlyField(source='total_amount')
+
+    class Meta:
+        model = CartIngredient
+        fields = (
+            'id', 'name', 'measurement_unit', 'amount'
+        )
+
+
+class RecipeReadSerializer(ImageVariantsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientReadSerializer(
         many=True,
@@ -106,40 +194,64 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
+        list_serializer_class = PrimingListSerializer
         fields = (
-            'id', 'name', 'image', 'ingredients', 'text',
+            'id', 'name', 'image', 'image_srcset', 'ingredients', 'text',
             'cooking_time', 'author', 'is_favorited', 'is_in_shopping_cart'
         )
 
-    def get_image(self, obj):
-        request = self.context.get('request')
-        if obj.image:
-            url = obj.image.url
-            if request:
-                return request.build_absolute_uri(url)
-            return url
-        return None
+    def prime(self, recipes):
+        self.fragments = load_recipe_fragments(recipes)
+        loaders = get_loaders(self.context)
+        loaders.is_favorited.prime(
+            recipe.pk for recipe in recipes
+            if not hasattr(recipe, 'is_favorited')
+        )
+        loaders.is_in_shopping_cart.prime(
+            recipe.pk for recipe in recipes
+            if not hasattr(recipe, 'is_in_shopping_cart')
+        )
+        loaders.is_subscribed.prime(
+            recipe.author_id for recipe in recipes
+            if not hasattr(recipe, 'is_author_subscribed')
+        )
 
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        user = request.user if request else None
-        return (
-            user
-            and user.is_authenticated
-            and obj.favorite.filter(user=user).exists()
+    def to_representation(self, instance):
+        recipes, authors = getattr(self, 'fragments', ({}, {}))
+        if instance.pk not in recipes or instance.author_id not in authors:
+            recipes, authors = load_recipe_fragments([instance])
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+
+        author = dict(authors[instance.author_id])
+        avatar = author.pop('avatar')
+        author['is_subscribed'] = self.fields['author'].get_is_subscribed(
+            instance.author
         )
+        author['avatar'] = self.build_url(avatar)
+
+        data = dict(recipes[instance.pk])
+        data.update(self.image_fields(
+            data['image'], data.pop('image_variants')
+        ))
+        data['author'] = author
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        return data
+
+    def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return get_loaders(self.context).is_favorited.load(obj.pk)
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        user = request.user if request else None
-        return (
-            user
-            and user.is_authenticated
-            and obj.cart.filter(user=user).exists()
-        )
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return get_loaders(self.context).is_in_shopping_cart.load(obj.pk)
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -157,21 +269,36 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             'cooking_time', 'ingredients'
         )
 
+    def validate_ingredients(self, ingredients):
+        """Проверяет все ингредиенты одним запросом и подставляет объекты.
+
+        Ошибки имеют тот же вид, что давал `PrimaryKeyRelatedField`:
+        список по элементам с ошибкой в поле `id`.
+        """
+        found = Ingredient.objects.in_bulk(
+            {item['id'] for item in ingredients}
+        )
+        errors = [
+            {} if item['id'] in found else {'id': [
+                serializers.PrimaryKeyRelatedField.default_error_messages[
+                    'does_not_exist'
+                ].format(pk_value=item['id'])
+            ]}
+            for item in ingredients
+        ]
+        if any(errors):
+            raise ValidationError(errors)
+        for item in ingredients:
+            item['id'] = found[item['id']]
+        return ingredients
+
     def validate(self, value):
-        ingredients = self.initial_data.get('ingredients')
+        ingredients = value.get('ingredients')
         if not ingredients:
             raise ValidationError('Добавьте хотя бы один ингредиент')
-
-        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        ingredient_ids = [item['id'].pk for item in ingredients]
         if len(ingredient_ids) != len(set(ingredient_ids)):
             raise ValidationError('Ингредиенты не должны повторяться')
-
-        for ingredient in ingredients:
-            if ingredient.get('amount') <= 0:
-                raise serializers.ValidationError(
-                    'Количество должно быть больше нуля'
-                )
-
         return value
 
     def validate_image(self, value):
@@ -182,6 +309,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         return value
 
     def create_ingredients(self, recipe, ingredients):
+        if not ingredients:
+            return
         RecipeIngredient.objects.bulk_create([
             RecipeIngredient(
                 recipe=recipe,
@@ -189,17 +318,66 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 amount=item['amount']
             ) for item in ingredients
         ])
+        adjust(
+            Ingredient.objects.filter(
+                pk__in=[item['id'].pk for item in ingredients]
+            ),
+            'recipes_count',
+            1
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         self.create_ingredients(recipe, ingredients)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """Применяет к составу рецепта только разницу со старым.
+
+        Возвращает True, если состав действительно изменился.
+        """
+        rows = {
+            row.ingredient_id: row for row in recipe.recipe_ingredients.all()
+        }
+        old_amounts = {pk: row.amount for pk, row in rows.items()}
+        new_amounts = {item['id'].pk: item['amount'] for item in ingredients}
+        if old_amounts == new_amounts:
+            return False
+
+        removed = rows.keys() - new_amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                pk__in=[rows[pk].pk for pk in removed]
+            ).delete()
+        self.create_ingredients(recipe, [
+            item for item in ingredients if item['id'].pk not in rows
+        ])
+        changed = []
+        for pk, row in rows.items():
+            if pk in new_amounts and row.amount != new_amounts[pk]:
+                row.amount = new_amounts[pk]
+                changed.append(row)
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        change_recipe_totals(
+            recipe.pk, diff_amounts(old_amounts, new_amounts)
+        )
+        return True
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        instance.recipe_ingredients.all().delete()
-        self.create_ingredients(instance, ingredients)
+        ingredients = validated_data.pop('ingredients', None)
+        changed = ingredients is not None and self.update_ingredients(
+            instance, ingredients
+        )
+        # Новое изображение приходит файлом, сравнить его со старым нельзя.
+        changed |= any(
+            field == 'image' or getattr(instance, field) != value
+            for field, value in validated_data.items()
+        )
+        if not changed:
+            return instance
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
@@ -209,20 +387,29 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ).data
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_LINKS_MAX_IDS
+    )
+
+
+class ShortRecipeSerializer(ImageVariantsMixin, serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+
+    default_image_size = IMAGE_SIZE_SHORT_DEFAULT
+    list_image_size = IMAGE_SIZE_SHORT_DEFAULT
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
 
 class SubscriptionSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        read_only=True,
-        source='recipes.count'
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
@@ -231,12 +418,22 @@ class SubscriptionSerializer(UserSerializer):
             + ('recipes', 'recipes_count')
         )
 
-    def get_recipes(self, obj):
+    def get_recipes_limit(self):
         request = self.context.get('request')
-        recipes = obj.recipes.all()
         try:
-            if limit := request.query_params.get('recipes_limit'):
-                recipes = recipes[:int(limit)]
-        except ValueError:
-            pass
+            limit = int(request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            return None
+        return limit if limit >= 0 else None
+
+    def prime(self, users):
+        super().prime(users)
+        get_loaders(self.context).latest_recipes(
+            self.get_recipes_limit()
+        ).prime(user.pk for user in users)
+
+    def get_recipes(self, obj):
+        recipes = get_loaders(self.context).latest_recipes(
+            self.get_recipes_limit()
+        ).load(obj.pk)
         return ShortRecipeSerializer(recipes, many=True).data
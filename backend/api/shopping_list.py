@@ -0,0 +1,157 @@
+import csv
+import io
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import CartIngredient
+from .conditional import make_etag
+from .constants import (
+    SHOPPING_LIST_CACHE_MAX_SIZE,
+    SHOPPING_LIST_CACHE_TIMEOUT,
+    SHOPPING_LIST_CHUNK_SIZE,
+    SHOPPING_LIST_PDF_FONT_SIZE,
+    SHOPPING_LIST_PDF_MARGIN
+)
+
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FALLBACK_FONT = 'Helvetica'
+
+
+def shopping_list_rows(user):
+    return CartIngredient.objects.filter(user=user).values_list(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'total_amount'
+    ).order_by('ingredient__name').iterator(
+        chunk_size=SHOPPING_LIST_CHUNK_SIZE
+    )
+
+
+def render_txt(rows):
+    separator = ''
+    for name, unit, total in rows:
+        yield f'{separator}{name}: {total} {unit}'.encode('utf-8')
+        separator = '\n'
+
+
+def render_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for name, unit, total in rows:
+        writer.writerow((name, total, unit))
+        if buffer.tell() >= SHOPPING_LIST_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def pdf_font():
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    try:
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+        )
+    except Exception:
+        return PDF_FALLBACK_FONT
+    return PDF_FONT_NAME
+
+
+def render_pdf(rows):
+    """Раскладывает строки по страницам по мере чтения курсора.
+
+    В отличие от TXT и CSV, PDF не потоковый: reportlab держит страницы
+    в памяти и пишет файл целиком в `save()`, поэтому первые байты уходят
+    клиенту только после последней страницы. Готовый файл больше
+    `SHOPPING_LIST_CACHE_MAX_SIZE` сбрасывается на диск и отдаётся оттуда
+    частями.
+    """
+    with tempfile.SpooledTemporaryFile(
+        max_size=SHOPPING_LIST_CACHE_MAX_SIZE
+    ) as output:
+        yield from write_pdf(rows, output)
+
+
+def write_pdf(rows, output):
+    pdf = canvas.Canvas(output, pagesize=A4)
+    pdf.setTitle('Список покупок')
+    font = pdf_font()
+    width, height = A4
+    line_height = SHOPPING_LIST_PDF_FONT_SIZE * 1.5
+    top = height - SHOPPING_LIST_PDF_MARGIN
+
+    pdf.setFont(font, SHOPPING_LIST_PDF_FONT_SIZE + 4)
+    pdf.drawString(SHOPPING_LIST_PDF_MARGIN, top, 'Список покупок')
+    y = top - line_height * 2
+    pdf.setFont(font, SHOPPING_LIST_PDF_FONT_SIZE)
+    for name, unit, total in rows:
+        if y < SHOPPING_LIST_PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, SHOPPING_LIST_PDF_FONT_SIZE)
+            y = top
+        pdf.drawString(
+            SHOPPING_LIST_PDF_MARGIN, y, f'• {name}: {total} {unit}'
+        )
+        y -= line_height
+    pdf.save()
+
+    output.seek(0)
+    while chunk := output.read(SHOPPING_LIST_CHUNK_SIZE):
+        yield chunk
+
+
+FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'pdf': ('application/pdf', render_pdf),
+}
+
+
+def render_and_cache(key, chunks):
+    parts, size = [], 0
+    for chunk in chunks:
+        yield chunk
+        if parts is not None:
+            parts.append(chunk)
+            size += len(chunk)
+            if size > SHOPPING_LIST_CACHE_MAX_SIZE:
+                parts = None
+    if parts is not None:
+        cache.set(key, b''.join(parts), SHOPPING_LIST_CACHE_TIMEOUT)
+
+
+def shopping_list_response(user, export_format, cart_state, stream=True):
+    """Отдаёт список покупок, по возможности частями.
+
+    Под ASGI Django 4.1 перебирает `StreamingHttpResponse` в цикле
+    событий, где запросы к базе запрещены, поэтому с `stream=False` файл
+    собирается целиком ещё в потоке представления.
+    """
+    content_type, render = FORMATS[export_format]
+    key = 'shopping-list:{}:{}:{}'.format(
+        user.pk, export_format, make_etag(cart_state).strip('"')
+    )
+    content = cache.get(key)
+    chunks = None
+    if content is None:
+        chunks = render_and_cache(key, render(shopping_list_rows(user)))
+        if not stream:
+            content = b''.join(chunks)
+    if content is not None:
+        response = HttpResponse(content, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{export_format}"'
+    )
+    return response
@@ -0,0 +1,136 @@
+"""Короткие ссылки на рецепты.
+
+Код — base62 от id рецепта, перемешанного умножением по модулю
+`62 ** SHORT_CODE_LENGTH`. Множитель взаимно прост с модулем, поэтому
+для id меньше модуля отображение взаимно однозначно: у рецепта всегда
+один и тот же код и проверять коллизии не нужно. Для id за пределами
+этого диапазона код не выдаётся.
+
+Переходы разрешаются через LRU-кэш процесса. Несуществующие коды он
+помнит только `SHORT_LINK_NEGATIVE_TTL` секунд, а код, выданный в этом
+процессе, сразу убирает из кэша. Счётчики переходов копятся в памяти и
+сбрасываются в базу одним UPDATE по таймеру через
+`SHORT_LINK_FLUSH_INTERVAL` секунд после первого несохранённого
+перехода, а также при завершении процесса.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+
+from django.db import DatabaseError, connections
+from django.db.models import Case, F, PositiveIntegerField, When
+
+from recipes.constants import SHORT_CODE_LENGTH
+from recipes.models import Recipe
+from .constants import (
+    SHORT_CODE_ALPHABET,
+    SHORT_CODE_MULTIPLIER,
+    SHORT_LINK_CACHE_SIZE,
+    SHORT_LINK_CACHE_TTL,
+    SHORT_LINK_FLUSH_INTERVAL,
+    SHORT_LINK_NEGATIVE_TTL
+)
+from .lru import MISSING, LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def encode(pk):
+    base = len(SHORT_CODE_ALPHABET)
+    modulus = base ** SHORT_CODE_LENGTH
+    if not 0 < pk < modulus:
+        raise ValueError(f'Для id {pk} нет короткого кода')
+    number = pk * SHORT_CODE_MULTIPLIER % modulus
+    digits = []
+    for _ in range(SHORT_CODE_LENGTH):
+        number, digit = divmod(number, base)
+        digits.append(SHORT_CODE_ALPHABET[digit])
+    return ''.join(reversed(digits))
+
+
+def issue_code(recipe):
+    if not recipe.short_code:
+        recipe.short_code = encode(recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk, short_code=None).update(
+            short_code=recipe.short_code
+        )
+        short_link_cache.delete(recipe.short_code)
+    return recipe.short_code
+
+
+class ClickCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.timer = None
+
+    def add(self, recipe_id):
+        with self.lock:
+            self.counts[recipe_id] += 1
+            self.schedule()
+
+    def schedule(self):
+        # Вызывается под self.lock.
+        if self.timer is None:
+            self.timer = threading.Timer(
+                SHORT_LINK_FLUSH_INTERVAL, self.flush_in_thread
+            )
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not counts:
+            return
+        try:
+            Recipe.objects.filter(pk__in=list(counts)).update(
+                clicks_count=Case(
+                    *(
+                        When(pk=pk, then=F('clicks_count') + clicks)
+                        for pk, clicks in counts.items()
+                    ),
+                    default=F('clicks_count'),
+                    output_field=PositiveIntegerField()
+                )
+            )
+        except DatabaseError:
+            logger.exception('Не удалось записать переходы по ссылкам')
+            with self.lock:
+                self.counts.update(counts)
+                self.schedule()
+
+
+short_link_cache = LRUCache(SHORT_LINK_CACHE_SIZE)
+click_counter = ClickCounter()
+atexit.register(click_counter.flush)
+
+
+def find_recipe_id(code):
+    recipes = Recipe.objects.values_list('pk', flat=True)
+    recipe_id = recipes.filter(short_code=code).first()
+    if recipe_id is None and code.isdigit():
+        # Раньше короткая ссылка вела прямо на id рецепта.
+        recipe_id = recipes.filter(pk=int(code)).first()
+    return recipe_id
+
+
+def resolve(code):
+    recipe_id = short_link_cache.get(code)
+    if recipe_id is MISSING:
+        recipe_id = find_recipe_id(code)
+        short_link_cache.set(code, recipe_id, (
+            SHORT_LINK_NEGATIVE_TTL if recipe_id is None
+            else SHORT_LINK_CACHE_TTL
+        ))
+    return recipe_id
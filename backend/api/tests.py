@@ -0,0 +1,1300 @@
+import csv
+import json
+import pickle
+import re
+import shutil
+import tempfile
+from base64 import urlsafe_b64encode
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import (
+    AsyncClient,
+    TestCase,
+    TransactionTestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.constants import SHORT_CODE_LENGTH
+from recipes.dump import open_dump
+from recipes.models import (
+    Cart,
+    CartIngredient,
+    Favorite,
+    FeedItem,
+    Ingredient,
+    Recipe,
+    RecipeIngredient
+)
+from users.models import Subscription, User
+from .async_views import async_read_urls
+from .authentication import (
+    CachedTokenAuthentication,
+    shared_key,
+    token_cache
+)
+from .catalog import rebuild_catalog
+from .constants import SHORT_CODE_ALPHABET, SHORT_LINK_FLUSH_INTERVAL
+from .ingredient_index import RecipeIngredientIndex
+from .loaders import Loader
+from .shopping_list import render_pdf
+from .short_links import click_counter, encode, short_link_cache
+from .urls import router
+
+TEMP_DIR = tempfile.mkdtemp()
+
+# Маршруты, как под ASGI: для ROOT_URLCONF='api.tests'.
+urlpatterns = [path('api/', include(async_read_urls(router.urls)))]
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+
+@override_settings(
+    MEDIA_ROOT=f'{TEMP_DIR}/media',
+    INGREDIENT_CATALOG_PATH=f'{TEMP_DIR}/ingredients.catalog',
+    RESPONSE_CACHE=''
+)
+class ApiTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(5)
+        )
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{index}',
+                email=f'author{index}@example.com',
+                first_name='Автор',
+                last_name=str(index),
+                password='password'
+            )
+            for index in range(3)
+        ]
+        cls.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            first_name='Читатель',
+            last_name='Читателев',
+            password='password'
+        )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def make_recipe(self, author=None, name='Рецепт', ingredients=None):
+        recipe = Recipe.objects.create(
+            author=author or self.authors[0],
+            name=name,
+            text='Описание',
+            cooking_time=10,
+            image='recipes/test.png'
+        )
+        for ingredient in ingredients or self.ingredients[:2]:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=100
+            )
+        return recipe
+
+
+class RecipeListQueriesTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        recipes = [
+            Recipe.objects.create(
+                author=cls.authors[index % 3],
+                name=f'Рецепт {index:02}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/test.png'
+            )
+            for index in range(12)
+        ]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for recipe in recipes for ingredient in cls.ingredients[:3]
+        )
+        Favorite.objects.create(user=cls.user, recipe=recipes[0])
+        Cart.objects.create(user=cls.user, recipe=recipes[1])
+        Subscription.objects.create(
+            subscriber=cls.user, author=cls.authors[0]
+        )
+
+    def assert_list_queries(self, client, expected):
+        for limit in (1, 5, 12):
+            cache.clear()
+            token_cache.clear()
+            with self.subTest(limit=limit), self.assertNumQueries(expected):
+                response = client.get(f'/api/recipes/?limit={limit}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous_list_queries_do_not_depend_on_page_size(self):
+        # COUNT, страница, ингредиенты рецептов.
+        self.assert_list_queries(self.anonymous, 3)
+
+    def test_authenticated_list_queries_do_not_depend_on_page_size(self):
+        # Токен, COUNT, страница с флагами, ингредиенты рецептов.
+        self.assert_list_queries(self.client, 4)
+
+    def test_flags_come_from_annotations(self):
+        response = self.client.get('/api/recipes/?limit=12')
+        flags = {
+            recipe['name']: (
+                recipe['is_favorited'],
+                recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed']
+            )
+            for recipe in response.data['results']
+        }
+        self.assertEqual(flags['Рецепт 00'], (True, False, True))
+        self.assertEqual(flags['Рецепт 01'], (False, True, False))
+        self.assertEqual(flags['Рецепт 03'], (False, False, True))
+
+    def test_count_skips_annotations_and_search_vector(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/recipes/?limit=5')
+        count_sql, page_sql = [
+            query['sql'] for query in queries.captured_queries
+            if 'recipes_recipe' in query['sql']
+            and 'recipes_recipeingredient' not in query['sql']
+        ]
+        self.assertIn('COUNT', count_sql)
+        self.assertNotIn('EXISTS', count_sql)
+        self.assertNotIn('search_vector', page_sql)
+
+
+class KeysetPaginationTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.authors[0],
+                name=name,
+                text='Описание',
+                cooking_time=10,
+                image='recipes/test.png'
+            )
+            # Одинаковые названия проверяют второй ключ — id.
+            for name in ('Борщ', 'Блины', 'Борщ', 'Щи', 'Каша', 'Борщ', 'Уха')
+        )
+
+    def walk(self, url):
+        names = []
+        while url:
+            response = self.anonymous.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            names.extend(item['name'] for item in response.data['results'])
+            url = response.data['next']
+        return names
+
+    def test_pages_follow_name_and_id(self):
+        expected = list(
+            Recipe.objects.order_by('name', 'id').values_list(
+                'name', flat=True
+            )
+        )
+        names = self.walk('/api/recipes/?cursor=&limit=2')
+        self.assertEqual(names, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.anonymous.get('/api/recipes/?cursor=&limit=3').data
+        second = self.anonymous.get(first['next']).data
+        back = self.anonymous.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(first['previous'])
+
+    def test_broken_cursor_is_not_found(self):
+        response = self.anonymous.get('/api/recipes/?cursor=broken')
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_wrong_value_types_is_not_found(self):
+        for url, position in (
+            ('/api/recipes/', ['Рецепт', 'abc']),
+            ('/api/recipes/', ['Рецепт', {'a': 1}]),
+            ('/api/recipes/', ['Рецепт', None]),
+            ('/api/users/', ['user', 'abc']),
+            ('/api/users/', ['user', None]),
+            ('/api/users/', [None, 1]),
+        ):
+            cursor = urlsafe_b64encode(
+                json.dumps({'p': position}).encode()
+            ).decode()
+            with self.subTest(url=url, position=position):
+                response = self.anonymous.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_page_number_mode_is_unchanged(self):
+        response = self.anonymous.get('/api/recipes/?limit=2&page=2')
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_subscriptions_use_username_keyset(self):
+        for author in self.authors:
+            Subscription.objects.create(subscriber=self.user, author=author)
+        usernames = []
+        url = '/api/users/subscriptions/?cursor=&limit=1'
+        while url:
+            response = self.client.get(url)
+            usernames.extend(
+                item['username'] for item in response.data['results']
+            )
+            url = response.data['next']
+        self.assertEqual(
+            usernames, sorted(author.username for author in self.authors)
+        )
+
+
+class RecipeFragmentCacheTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.make_recipe(name='Плов')
+
+    def ingredient_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [
+            query for query in queries.captured_queries
+            if 'recipes_recipeingredient' in query['sql']
+        ]
+
+    def test_second_request_takes_fragment_from_cache(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        first, queries = self.ingredient_queries(url)
+        self.assertEqual(len(queries), 1)
+        second, queries = self.ingredient_queries(url)
+        self.assertEqual(queries, [])
+        self.assertEqual(second.data, first.data)
+
+    def test_saved_recipe_and_author_are_rebuilt(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        self.anonymous.get(url)
+        self.recipe.name = 'Плов с курицей'
+        self.recipe.save()
+        author = self.recipe.author
+        author.first_name = 'Повар'
+        author.save()
+        response, queries = self.ingredient_queries(url)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['name'], 'Плов с курицей')
+        self.assertEqual(response.data['author']['first_name'], 'Повар')
+
+    def test_viewer_flags_are_not_cached(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        self.assertFalse(self.client.get(url).data['is_favorited'])
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        self.assertTrue(self.client.get(url).data['is_favorited'])
+        self.assertFalse(self.anonymous.get(url).data['is_favorited'])
+
+
+class ConditionalGetTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.make_recipe()
+        self.urls = (
+            f'/api/recipes/{self.recipe.pk}/',
+            f'/api/ingredients/{self.ingredients[0].pk}/',
+            f'/api/users/{self.authors[0].pk}/',
+        )
+
+    def test_repeated_get_is_not_modified(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.anonymous.get(url)['ETag']
+                response = self.anonymous.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_viewer_state_changes_etag(self):
+        url = self.urls[0]
+        etag = self.client.get(url)['ETag']
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_non_numeric_pk_is_not_found(self):
+        for url in ('/api/recipes/abc/', '/api/ingredients/abc/',
+                    '/api/users/abc/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.anonymous.get(url).status_code, 404)
+
+    @override_settings(ROOT_URLCONF='api.tests')
+    async def test_async_path_is_not_modified_and_not_found(self):
+        client = AsyncClient()
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = (await client.get(url))['ETag']
+                response = await client.get(
+                    url, **{'if-none-match': etag}
+                )
+                self.assertEqual(response.status_code, 304)
+        for url in ('/api/recipes/abc/', '/api/ingredients/abc/',
+                    '/api/users/abc/'):
+            with self.subTest(url=url):
+                response = await client.get(url)
+                self.assertEqual(response.status_code, 404)
+
+
+class RecipeSearchTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name, text in (
+            ('Щи из капусты', 'Сварить бульон.'),
+            ('Борщ', 'Добавить свёклу и капусту.'),
+            ('Блины', 'Смешать муку и молоко.'),
+        ):
+            Recipe.objects.create(
+                author=cls.authors[0],
+                name=name,
+                text=text,
+                cooking_time=10,
+                image='recipes/test.png'
+            )
+
+    def search(self, value):
+        response = self.anonymous.get('/api/recipes/', {'search': value})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    @skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+    def test_search_matches_word_forms_and_ranks_name_first(self):
+        self.assertEqual(self.search('капуста'), ['Щи из капусты', 'Борщ'])
+
+    def test_search_finds_text_and_name(self):
+        self.assertEqual(self.search('молоко'), ['Блины'])
+        self.assertEqual(self.search('Борщ'), ['Борщ'])
+
+    def test_blank_search_returns_everything(self):
+        self.assertEqual(len(self.search(' ')), 3)
+
+
+class IngredientAutocompleteTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in (
+                'Картофель', 'картофельный крахмал', 'Капуста', 'Морковь'
+            )
+        )
+
+    def setUp(self):
+        super().setUp()
+        rebuild_catalog()
+
+    def names(self, value):
+        response = self.anonymous.get('/api/ingredients/', {'name': value})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_prefix_is_case_insensitive(self):
+        expected = ['Картофель', 'картофельный крахмал']
+        self.assertEqual(self.names('карт'), expected)
+        self.assertEqual(self.names('КАРТ'), expected)
+
+    def test_empty_name_returns_whole_list(self):
+        self.assertEqual(len(self.names('')), Ingredient.objects.count())
+
+    @skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+    def test_typo_falls_back_to_trigram_similarity(self):
+        self.assertEqual(self.names('картофил')[0], 'Картофель')
+        self.assertEqual(self.names('мрковь'), ['Морковь'])
+
+
+class IngredientCatalogTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        rebuild_catalog()
+
+    def test_list_and_prefix_search_skip_database(self):
+        expected = list(
+            Ingredient.objects.order_by('name', 'id').values(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        with self.assertNumQueries(0):
+            response = self.anonymous.get('/api/ingredients/')
+            # Короткий префикс не требует нечёткого поиска в базе.
+            found = self.anonymous.get('/api/ingredients/', {'name': 'И'})
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(found.json(), expected)
+
+    def test_ingredient_changes_rebuild_catalog_on_commit(self):
+        etag = self.anonymous.get('/api/ingredients/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Ingredient.objects.create(name='Айва', measurement_unit='шт')
+            Ingredient.objects.create(name='Алыча', measurement_unit='г')
+        self.assertEqual(len(callbacks), 1)
+        response = self.anonymous.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['name'] for item in response.json()[:2]], ['Айва', 'Алыча']
+        )
+
+
+class IngredientIndexFilterTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        first, second, third = cls.ingredients[:3]
+        cls.recipes = {}
+        for name, items in (
+            ('Первое и второе', (first, second)),
+            ('Только первое', (first,)),
+            ('Все три', (first, second, third)),
+            ('Третье', (third,)),
+        ):
+            recipe = Recipe.objects.create(
+                author=cls.authors[0],
+                name=name,
+                text='Описание',
+                cooking_time=10,
+                image='recipes/test.png'
+            )
+            for ingredient in items:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+            cls.recipes[name] = recipe
+
+    def setUp(self):
+        super().setUp()
+        self.index = RecipeIngredientIndex()
+        patcher = mock.patch(
+            'api.ingredient_index.recipe_ingredient_index', self.index
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def names(self, **params):
+        params = {
+            key: ','.join(str(self.ingredients[pk].pk) for pk in value)
+            for key, value in params.items()
+        }
+        response = self.anonymous.get(
+            '/api/recipes/', {**params, 'limit': 10}
+        )
+        self.assertEqual(response.status_code, 200)
+        return {recipe['name'] for recipe in response.data['results']}
+
+    def assert_filters(self):
+        self.assertEqual(
+            self.names(ingredients_all=(0, 1)),
+            {'Первое и второе', 'Все три'}
+        )
+        self.assertEqual(
+            self.names(ingredients_all=(2,)), {'Все три', 'Третье'}
+        )
+        self.assertEqual(
+            self.names(ingredients_any=(1, 2)),
+            {'Первое и второе', 'Все три', 'Третье'}
+        )
+        self.assertEqual(
+            self.names(pantry=(0, 1)), {'Первое и второе', 'Только первое'}
+        )
+
+    def test_index_filters(self):
+        self.assert_filters()
+
+    def test_large_results_fall_back_to_database(self):
+        with mock.patch('api.filters.INGREDIENT_INDEX_MAX_IDS', 0):
+            self.assert_filters()
+
+    def test_repeated_requests_do_not_check_freshness(self):
+        self.names(ingredients_any=(0,))
+        with CaptureQueriesContext(connection) as queries:
+            self.names(ingredients_any=(0,))
+        self.assertFalse(any(
+            'recipes_recipeingredient' in query['sql']
+            or 'updated_at' in query['sql'].split('FROM')[-1]
+            for query in queries.captured_queries
+        ))
+
+    def test_committed_writes_update_index(self):
+        self.names(ingredients_any=(0,))
+        snapshot = self.index.snapshot
+        recipe = self.recipes['Только первое']
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=self.ingredients[1], amount=1
+            )
+            self.recipes['Третье'].delete()
+        self.assertEqual(
+            self.names(ingredients_all=(0, 1)),
+            {'Первое и второе', 'Все три', 'Только первое'}
+        )
+        self.assertNotIn(
+            self.recipes['Третье'].pk, self.index.with_any(
+                [self.ingredients[2].pk]
+            )
+        )
+        # Старый снимок у читателей не меняется.
+        self.assertEqual(
+            snapshot[0][recipe.pk], frozenset([self.ingredients[0].pk])
+        )
+
+
+class ShoppingListExportTest(ApiTestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        super().setUp()
+        first, second, third = self.ingredients[:3]
+        for recipe in (
+            self.make_recipe(name='Суп', ingredients=(first, second)),
+            self.make_recipe(name='Салат', ingredients=(second, third)),
+        ):
+            Cart.objects.create(user=self.user, recipe=recipe)
+
+    def download(self, export_format=None):
+        params = {'format': export_format} if export_format else {}
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_txt_sums_amounts_by_ingredient(self):
+        response, content = self.download()
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertEqual(content.decode(), '\n'.join((
+            'Ингредиент 0: 100 г',
+            'Ингредиент 1: 200 г',
+            'Ингредиент 2: 100 г',
+        )))
+
+    def test_csv_and_pdf(self):
+        response, content = self.download('csv')
+        self.assertIn(
+            'shopping_list.csv', response['Content-Disposition']
+        )
+        rows = content.decode('utf-8-sig').splitlines()
+        self.assertEqual(rows[0], 'Ингредиент,Количество,Единица измерения')
+        self.assertEqual(rows[2], 'Ингредиент 1,200,г')
+        response, content = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_long_pdf_spans_pages_and_is_sent_in_chunks(self):
+        rows = ((f'Продукт {index}', 'г', index) for index in range(200))
+        chunks = list(render_pdf(rows))
+        self.assertGreater(len(chunks), 1)
+        content = b''.join(chunks)
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertGreater(len(re.findall(rb'/Type /Page\b', content)), 1)
+
+    @override_settings(ROOT_URLCONF='api.tests')
+    async def test_download_under_asgi(self):
+        client = AsyncClient()
+        headers = {'authorization': f'Token {self.token.key}'}
+        for export_format in ('txt', 'csv', 'pdf'):
+            with self.subTest(export_format=export_format):
+                response = await client.get(
+                    self.url, {'format': export_format}, **headers
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.streaming)
+                self.assertIn(
+                    f'shopping_list.{export_format}',
+                    response['Content-Disposition']
+                )
+        self.assertEqual(response.content[:4], b'%PDF')
+        response = await client.get(self.url, **headers)
+        self.assertEqual(response.content.decode().splitlines()[1], (
+            'Ингредиент 1: 200 г'
+        ))
+
+    def test_repeated_download_is_served_from_cache(self):
+        _, content = self.download()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.content, content)
+        self.assertFalse(any(
+            'recipes_cartingredient' in query['sql']
+            for query in queries.captured_queries
+        ))
+
+    def test_unknown_format_and_empty_cart_are_not_found(self):
+        response = self.client.get(self.url, {'format': 'docx'})
+        self.assertEqual(response.status_code, 404)
+        Cart.objects.filter(user=self.user).delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class BulkLinksTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.soup = self.make_recipe(name='Суп')
+        self.salad = self.make_recipe(name='Салат')
+
+    def statuses(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return {
+            item['id']: item['status'] for item in response.data['results']
+        }
+
+    def test_bulk_favorites_report_status_per_id(self):
+        url = '/api/recipes/favorite/'
+        Favorite.objects.create(user=self.user, recipe=self.soup)
+        missing = self.salad.pk + 1000
+        self.assertEqual(
+            self.statuses('post', url, [self.soup.pk, self.salad.pk, missing]),
+            {self.soup.pk: 'exists', self.salad.pk: 'created',
+             missing: 'not_found'}
+        )
+        self.salad.refresh_from_db()
+        self.assertEqual(self.salad.favorites_count, 1)
+        self.assertEqual(
+            self.statuses('delete', url, [self.soup.pk, self.soup.pk]),
+            {self.soup.pk: 'deleted'}
+        )
+        self.assertFalse(
+            Favorite.objects.filter(user=self.user, recipe=self.soup).exists()
+        )
+
+    def test_bulk_cart_updates_totals(self):
+        url = '/api/recipes/shopping_cart/'
+        self.statuses('post', url, [self.soup.pk, self.salad.pk])
+        self.assertEqual(
+            set(CartIngredient.objects.filter(user=self.user).values_list(
+                'ingredient', 'total_amount'
+            )),
+            {(self.ingredients[0].pk, 200), (self.ingredients[1].pk, 200)}
+        )
+        self.statuses('delete', url, [self.soup.pk, self.salad.pk])
+        self.assertFalse(
+            CartIngredient.objects.filter(user=self.user).exists()
+        )
+
+    def test_bulk_subscribe_skips_self(self):
+        url = '/api/users/subscribe/'
+        author = self.authors[1]
+        self.assertEqual(
+            self.statuses('post', url, [author.pk, self.user.pk]),
+            {author.pk: 'created', self.user.pk: 'self'}
+        )
+        author.refresh_from_db()
+        self.assertEqual(author.subscribers_count, 1)
+        self.assertEqual(
+            self.statuses('delete', url, [author.pk, self.authors[2].pk]),
+            {author.pk: 'deleted', self.authors[2].pk: 'absent'}
+        )
+
+    def test_single_endpoints_keep_their_responses(self):
+        url = f'/api/recipes/{self.soup.pk}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Рецепт уже в избранном'})
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+
+    def test_ids_are_validated(self):
+        response = self.client.post(
+            '/api/recipes/favorite/', {'ids': []}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/recipes/favorite/', {'ids': list(range(1, 502))},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class SubscriptionRecipesTest(ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for author in cls.authors:
+            Subscription.objects.create(subscriber=cls.user, author=author)
+            for index in range(4):
+                Recipe.objects.create(
+                    author=author,
+                    name=f'{author.username} {index}',
+                    text='Описание',
+                    cooking_time=10,
+                    image='recipes/test.png'
+                )
+
+    def test_latest_recipes_per_author_with_constant_queries(self):
+        for limit in (1, 3):
+            token_cache.clear()
+            # Токен, COUNT, страница авторов, рецепты всех авторов.
+            with self.subTest(limit=limit), self.assertNumQueries(4):
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'limit': limit, 'recipes_limit': 2}
+                )
+            for author in response.data['results']:
+                self.assertTrue(author['is_subscribed'])
+                self.assertEqual(author['recipes_count'], 4)
+                self.assertEqual(
+                    [recipe['name'] for recipe in author['recipes']],
+                    [f'{author["username"]} 3', f'{author["username"]} 2']
+                )
+        self.assertEqual(
+            [author['username'] for author in response.data['results']],
+            ['author0', 'author1', 'author2']
+        )
+
+
+class FeedTest(ApiTestCase):
+    url = '/api/recipes/feed/'
+
+    def setUp(self):
+        super().setUp()
+        self.old = self.make_recipe(author=self.authors[0], name='Старый')
+        self.other = self.make_recipe(author=self.authors[2], name='Чужой')
+
+    def walk(self, limit=2):
+        names, url = [], f'{self.url}?limit={limit}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            names.extend(recipe['name'] for recipe in response.data['results'])
+            url = response.data['next']
+        return names
+
+    def subscribe(self, author):
+        response = self.client.post(f'/api/users/{author.pk}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+
+    def test_feed_merges_backfill_fan_out_and_large_authors(self):
+        self.subscribe(self.authors[0])
+        self.make_recipe(author=self.authors[0], name='Новый')
+        # Теперь все авторы «крупные»: их рецепты не пишутся в ленту,
+        # а подмешиваются при чтении без дублей с уже записанными.
+        with mock.patch('recipes.feed.FEED_FANOUT_MAX_SUBSCRIBERS', 0):
+            self.subscribe(self.authors[1])
+            for author in self.authors[:2]:
+                author.refresh_from_db()
+            self.make_recipe(author=self.authors[1], name='Популярный 1')
+            self.make_recipe(author=self.authors[1], name='Популярный 2')
+            self.make_recipe(author=self.authors[0], name='Новейший')
+            names = self.walk()
+        self.assertEqual(names, [
+            'Новейший', 'Популярный 2', 'Популярный 1', 'Новый', 'Старый'
+        ])
+        self.assertEqual(
+            FeedItem.objects.filter(user=self.user).count(), 2
+        )
+
+    def test_unsubscribe_removes_author_from_feed(self):
+        self.subscribe(self.authors[0])
+        self.assertEqual(self.walk(), ['Старый'])
+        self.client.delete(f'/api/users/{self.authors[0].pk}/subscribe/')
+        self.assertEqual(self.walk(), [])
+
+    def test_feed_requires_authentication(self):
+        self.assertEqual(self.anonymous.get(self.url).status_code, 401)
+
+
+class RequestLoadersTest(ApiTestCase):
+    def test_loader_fetches_primed_keys_once(self):
+        calls = []
+
+        def fetch(keys):
+            calls.append(set(keys))
+            return {key: key * 10 for key in keys if key != 3}
+
+        loader = Loader(fetch, default=0)
+        loader.prime([1, 2, 3])
+        self.assertEqual(
+            [loader.load(1), loader.load(3), loader.load(2)], [10, 0, 20]
+        )
+        self.assertEqual(loader.load(4), 40)
+        self.assertEqual(calls, [{1, 2, 3}, {4}])
+
+    def test_user_list_flags_cost_one_query(self):
+        Subscription.objects.create(
+            subscriber=self.user, author=self.authors[1]
+        )
+        for limit in (1, 4):
+            token_cache.clear()
+            # Токен, COUNT, страница, подписки страницы.
+            with self.subTest(limit=limit), self.assertNumQueries(4):
+                response = self.client.get('/api/users/', {'limit': limit})
+            self.assertEqual(len(response.data['results']), limit)
+        flags = {
+            user['username']: user['is_subscribed']
+            for user in response.data['results']
+        }
+        self.assertEqual(flags, {
+            'author0': False, 'author1': True,
+            'author2': False, 'reader': False
+        })
+
+    def test_anonymous_flags_need_no_query(self):
+        with self.assertNumQueries(2):
+            response = self.anonymous.get('/api/users/', {'limit': 4})
+        self.assertFalse(any(
+            user['is_subscribed'] for user in response.data['results']
+        ))
+
+
+class ImportIngredientsTest(ApiTestCase):
+    def write(self, name, content):
+        path = f'{TEMP_DIR}/{name}'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def import_file(self, path, **options):
+        output = StringIO()
+        call_command('import_ingredients', path, stdout=output, **options)
+        return output.getvalue()
+
+    def units(self):
+        return dict(Ingredient.objects.exclude(
+            name__startswith='Ингредиент'
+        ).values_list('name', 'measurement_unit'))
+
+    def test_csv_skips_duplicates_and_invalid_rows(self):
+        path = self.write('ingredients.csv', '\n'.join((
+            'Соль,г', 'Сахар,г', 'Соль,г', 'Ингредиент 0,г',
+            ',г', 'Без единицы', f'{"x" * 101},г',
+        )))
+        output = self.import_file(path, batch_size=2)
+        self.assertIn('новых ингредиентов 2', output)
+        self.assertIn('пропущено некорректных 3', output)
+        self.assertEqual(self.units(), {'Соль': 'г', 'Сахар': 'г'})
+
+    def test_json_array_and_ndjson(self):
+        items = [
+            {'name': 'Мука', 'measurement_unit': 'г'},
+            {'name': 'Молоко', 'measurement_unit': 'мл'},
+        ]
+        self.import_file(self.write('array.json', json.dumps(items)))
+        self.import_file(self.write('lines.jsonl', '\n'.join(
+            json.dumps(item, ensure_ascii=False) for item in (
+                *items, {'name': 'Яйцо', 'measurement_unit': 'шт'}
+            )
+        )))
+        self.assertEqual(
+            self.units(), {'Мука': 'г', 'Молоко': 'мл', 'Яйцо': 'шт'}
+        )
+
+    def test_dry_run_changes_nothing(self):
+        path = self.write('ingredients.csv', 'Соль,г\nСахар,г')
+        output = self.import_file(path, dry_run=True, batch_size=1)
+        self.assertIn('новых ингредиентов 2', output)
+        self.assertEqual(self.units(), {})
+
+    def test_error_keeps_batches_loaded_before_it(self):
+        path = self.write('broken.json', json.dumps([
+            {'name': 'Соль', 'measurement_unit': 'г'},
+            {'name': 'Сахар', 'measurement_unit': 'г'},
+            {'name': 'Перец', 'measurement_unit': 'г'},
+        ])[:-2] + ' мусор')
+        with self.assertRaises(CommandError):
+            self.import_file(path, batch_size=2)
+        self.assertEqual(self.units(), {'Соль': 'г', 'Сахар': 'г'})
+        names = [
+            item['name']
+            for item in self.anonymous.get('/api/ingredients/').json()
+        ]
+        self.assertIn('Соль', names)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+class ImportIngredientsCommitTest(TransactionTestCase):
+    def test_batches_are_committed_separately(self):
+        # TransactionTestCase идёт после tearDownModule, нужен свой каталог.
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = f'{directory}/committed.csv'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(f'Продукт {index},г' for index in range(5)))
+        with self.settings(
+            INGREDIENT_CATALOG_PATH=f'{directory}/ingredients.catalog',
+            RESPONSE_CACHE=''
+        ), CaptureQueriesContext(connection) as queries:
+            call_command(
+                'import_ingredients', path, batch_size=2, stdout=StringIO()
+            )
+        self.assertEqual(Ingredient.objects.count(), 5)
+        self.assertEqual(sum(
+            query['sql'].startswith('INSERT INTO "recipes_ingredient"')
+            for query in queries.captured_queries
+        ), 3)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass('ingredient_import')")
+            self.assertIsNone(cursor.fetchone()[0])
+
+
+class RecipeDumpTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_recipe(author=self.authors[0], name='Суп')
+        self.make_recipe(
+            author=self.authors[1], name='Каша',
+            ingredients=self.ingredients[2:5]
+        )
+
+    def export(self, path):
+        call_command('export_recipes', path, chunk_size=1, stdout=StringIO())
+        with open_dump(path, 'r') as file:
+            return [json.loads(line) for line in file]
+
+    def test_round_trip_recreates_authors_ingredients_and_counters(self):
+        exported = self.export(f'{TEMP_DIR}/recipes.ndjson.gz')
+        Recipe.objects.all().delete()
+        self.authors[1].delete()
+        self.ingredients[4].delete()
+        call_command(
+            'import_recipes', f'{TEMP_DIR}/recipes.ndjson.gz',
+            batch_size=1, id_map=f'{TEMP_DIR}/ids.csv', stdout=StringIO()
+        )
+
+        reexported = self.export(f'{TEMP_DIR}/again.ndjson')
+        with open(f'{TEMP_DIR}/ids.csv') as file:
+            id_map = dict(csv.reader(file))
+        self.assertEqual(id_map, {
+            str(old['id']): str(new['id'])
+            for old, new in zip(exported, reexported)
+        })
+        for record in exported + reexported:
+            del record['id']
+        self.assertEqual(reexported, exported)
+        author = User.objects.get(username='author1')
+        self.assertFalse(author.has_usable_password())
+        call_command('rebuild_counters', check=True, stdout=StringIO())
+
+
+class RecipeIngredientsDiffTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.make_recipe(ingredients=self.ingredients[:3])
+        self.author = APIClient()
+        self.author.force_authenticate(self.recipe.author)
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def patch(self, amounts, **data):
+        response = self.author.patch(self.url, {
+            'ingredients': [
+                {'id': self.ingredients[index].pk, 'amount': amount}
+                for index, amount in amounts.items()
+            ],
+            **data
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response
+
+    def rows(self):
+        return {
+            row.ingredient_id: (row.pk, row.amount)
+            for row in self.recipe.recipe_ingredients.all()
+        }
+
+    def test_same_ingredients_write_nothing(self):
+        updated_at = Recipe.objects.get(pk=self.recipe.pk).updated_at
+        with CaptureQueriesContext(connection) as queries:
+            self.patch({0: 100, 1: 100, 2: 100}, name=self.recipe.name)
+        self.assertFalse(any(
+            query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+            for query in queries.captured_queries
+        ))
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).updated_at, updated_at
+        )
+
+    def test_only_changed_rows_are_written(self):
+        Cart.objects.create(user=self.user, recipe=self.recipe)
+        before = self.rows()
+        response = self.patch({0: 100, 1: 5, 3: 7})
+        after = self.rows()
+        first, second, third, fourth = (
+            ingredient.pk for ingredient in self.ingredients[:4]
+        )
+        self.assertEqual(after[first], before[first])
+        self.assertEqual(after[second], (before[second][0], 5))
+        self.assertNotIn(third, after)
+        self.assertEqual(after[fourth][1], 7)
+        self.assertEqual(
+            sorted(item['amount'] for item in response.data['ingredients']),
+            [5, 7, 100]
+        )
+        self.assertEqual(
+            dict(CartIngredient.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'total_amount'
+            )),
+            {first: 100, second: 5, fourth: 7}
+        )
+        call_command('rebuild_counters', check=True, stdout=StringIO())
+
+
+# Прозрачный PNG 1×1.
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJ'
+    'AAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+)
+
+
+class RecipeIngredientsValidationTest(ApiTestCase):
+    def post(self, ingredients):
+        return self.client.post('/api/recipes/', {
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 5,
+            'image': IMAGE,
+            'ingredients': ingredients,
+        }, format='json')
+
+    def test_valid_ingredients_are_checked_with_one_query(self):
+        ingredients = [
+            {'id': ingredient.pk, 'amount': 10}
+            for ingredient in self.ingredients
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post(ingredients)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(sum(
+            'FROM "recipes_ingredient"' in query['sql']
+            and 'recipes_recipe' not in query['sql']
+            for query in queries.captured_queries
+        ), 1)
+
+    def test_errors_keep_their_original_shape(self):
+        first, second = (ingredient.pk for ingredient in self.ingredients[:2])
+        unknown = self.ingredients[-1].pk + 1000
+        for ingredients, expected in (
+            ([], {'non_field_errors': ['Добавьте хотя бы один ингредиент']}),
+            (
+                [{'id': first, 'amount': 1}, {'id': first, 'amount': 2}],
+                {'non_field_errors': ['Ингредиенты не должны повторяться']}
+            ),
+            (
+                [{'id': first, 'amount': 1}, {'id': unknown, 'amount': 1}],
+                {'ingredients': [{}, {'id': [
+                    f'Invalid pk "{unknown}" - object does not exist.'
+                ]}]}
+            ),
+            (
+                [{'id': second, 'amount': 0}],
+                {'ingredients': [{'amount': [
+                    'Ensure this value is greater than or equal to 1.'
+                ]}]}
+            ),
+        ):
+            with self.subTest(ingredients=ingredients):
+                response = self.post(ingredients)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), expected)
+        self.assertFalse(Recipe.objects.exists())
+
+
+class ShortLinkTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        short_link_cache.clear()
+        self.recipe = self.make_recipe()
+
+    def test_get_link_issues_stable_base62_code(self):
+        links = {
+            self.anonymous.get(
+                f'/api/recipes/{self.recipe.pk}/get-link/'
+            ).json()['short-link']
+            for _ in range(2)
+        }
+        self.assertEqual(len(links), 1)
+        link = links.pop()
+        self.assertTrue(link.startswith(settings.LINK_DOMAIN))
+        code = link[len(settings.LINK_DOMAIN):]
+        self.assertRegex(code, r'^[0-9A-Za-z]{6}$')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.short_code, code)
+
+    def test_code_redirects_to_recipe_and_counts_clicks(self):
+        code = self.anonymous.get(
+            f'/api/recipes/{self.recipe.pk}/get-link/'
+        ).json()['short-link'].rsplit('/', 1)[1]
+        for _ in range(2):
+            response = self.anonymous.get(f'/s/{code}')
+            self.assertRedirects(
+                response, f'/api/recipes/{self.recipe.pk}/',
+                fetch_redirect_response=False
+            )
+        click_counter.flush()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.clicks_count, 2)
+
+    def test_unknown_code_is_not_found(self):
+        self.assertEqual(self.anonymous.get('/s/zzzzzz').status_code, 404)
+
+    def test_codes_exist_only_below_modulus(self):
+        modulus = len(SHORT_CODE_ALPHABET) ** SHORT_CODE_LENGTH
+        self.assertNotEqual(encode(1), encode(modulus - 1))
+        for pk in (0, modulus, modulus + 1):
+            with self.subTest(pk=pk), self.assertRaises(ValueError):
+                encode(pk)
+
+    def test_issued_code_is_not_hidden_by_negative_cache(self):
+        code = encode(self.recipe.pk)
+        self.assertEqual(self.anonymous.get(f'/s/{code}').status_code, 404)
+        self.anonymous.get(f'/api/recipes/{self.recipe.pk}/get-link/')
+        self.assertEqual(self.anonymous.get(f'/s/{code}').status_code, 302)
+
+    def test_clicks_are_flushed_by_timer(self):
+        with mock.patch('api.short_links.threading.Timer') as timer:
+            click_counter.add(self.recipe.pk)
+            click_counter.add(self.recipe.pk)
+        timer.assert_called_once_with(
+            SHORT_LINK_FLUSH_INTERVAL, click_counter.flush_in_thread
+        )
+        timer.return_value.start.assert_called_once_with()
+        with mock.patch('api.short_links.connections') as connections:
+            click_counter.flush_in_thread()
+        connections.close_all.assert_called_once_with()
+        self.assertIsNone(click_counter.timer)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.clicks_count, 2)
+
+
+class TokenCacheTest(ApiTestCase):
+    def authenticate(self):
+        return CachedTokenAuthentication().authenticate_credentials(
+            self.token.key
+        )
+
+    def test_each_request_gets_its_own_user(self):
+        first, _ = self.authenticate()
+        first.first_name = 'Изменён'
+        first._state.fields_cache['marker'] = object()
+        with self.assertNumQueries(0):
+            second, token = self.authenticate()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.first_name, 'Читатель')
+        self.assertNotIn('marker', second._state.fields_cache)
+        self.assertEqual(token.user, second)
+        self.assertEqual(second.pk, self.user.pk)
+
+    def test_cache_holds_no_password_and_save_keeps_it(self):
+        self.authenticate()
+        user, _ = self.authenticate()
+        self.assertIn('password', user.get_deferred_fields())
+        user.first_name = 'Новое'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Новое')
+        self.assertTrue(self.user.check_password('password'))
+
+    @override_settings(
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'tokens': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'tokens',
+            },
+        },
+        TOKEN_AUTH_CACHE='tokens'
+    )
+    def test_cached_payload_holds_no_password(self):
+        User.objects.filter(pk=self.user.pk).update(avatar='users/avatar.png')
+        self.authenticate()
+        payloads = [
+            pickle.dumps(token_cache.get(self.token.key)),
+            pickle.dumps(caches['tokens'].get(shared_key(self.token.key))),
+        ]
+        for payload in payloads:
+            self.assertNotIn(b'pbkdf2', payload)
+            self.assertNotIn(self.user.password.encode(), payload)
+        user, _ = self.authenticate()
+        self.assertEqual(user.avatar.name, 'users/avatar.png')
+        self.assertIs(user.avatar.instance, user)
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'responses',
+        },
+    },
+    RESPONSE_CACHE='responses'
+)
+class ResponseCacheTest(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        caches['responses'].clear()
+        self.recipe = self.make_recipe(ingredients=self.ingredients[:2])
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def test_anonymous_hit_skips_database(self):
+        first = self.anonymous.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = self.anonymous.get(self.url)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.anonymous.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries.captured_queries)
+
+    def test_write_purges_cached_responses(self):
+        self.anonymous.get(self.url)
+        self.anonymous.get('/api/recipes/')
+        self.anonymous.get('/api/ingredients/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+            Ingredient.objects.create(name='Шафран', measurement_unit='г')
+        self.assertEqual(
+            self.anonymous.get(self.url).json()['name'], 'Новое название'
+        )
+        self.assertEqual(
+            self.anonymous.get('/api/recipes/').json()['results'][0]['name'],
+            'Новое название'
+        )
+        self.assertIn('Шафран', [
+            item['name']
+            for item in self.anonymous.get('/api/ingredients/').json()
+        ])
+
+    def test_purge_waits_for_commit(self):
+        self.anonymous.get(self.url)
+        with self.captureOnCommitCallbacks(execute=False):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+            with self.assertNumQueries(0):
+                response = self.anonymous.get(self.url)
+        self.assertEqual(response.json()['name'], 'Рецепт')
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .async_views import async_read_urls
 from .views import (
     UserViewSet,
     IngredientViewSet,
@@ -12,7 +14,11 @@ router.register(r'users', UserViewSet)
 router.register(r'recipes', RecipeViewSet)
 router.register(r'ingredients', IngredientViewSet)
 
+router_urls = router.urls
+if settings.ASYNC_READ_PATH:
+    router_urls = async_read_urls(router_urls)
+
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
-    path('', include(router.urls))
+    path('', include(router_urls))
 ]
@@ -1,83 +1,357 @@
-import os
-
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect
-from django.http import FileResponse
-from rest_framework import viewsets, status, filters
+from django.http import Http404, HttpResponse
+from rest_framework import viewsets, status
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum
+from django.db.models import Count, Exists, Max, OuterRef, Value
 
 from recipes.models import (
     Recipe, Ingredient,
-    RecipeIngredient, Cart, Favorite
+    Cart, CartIngredient, Favorite
+)
+from recipes.feed import feed_recipe_ids
+from recipes.links import (
+    ABSENT,
+    DELETED,
+    EXISTS,
+    NOT_FOUND,
+    SELF,
+    change_links
 )
+from tasks.queue import enqueue
 from users.models import User, Subscription
 from .serializers import (
     UserSerializer, UserCreateSerializer, AvatarSerializer,
     IngredientSerializer, RecipeReadSerializer, ShortRecipeSerializer,
-    RecipeWriteSerializer, SubscriptionSerializer
+    RecipeWriteSerializer, SubscriptionSerializer, CartIngredientSerializer,
+    BulkIdsSerializer
 )
 from .permissions import (
     IsAuthorOrReadOnly,
     AdminOrReadOnly
 )
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import Paginator
+from .pagination import FeedPaginator, Paginator
+from .conditional import ConditionalGetMixin
+from .catalog import get_catalog
+from .renderers import (
+    CsvRenderer,
+    FormatParamNegotiation,
+    PdfRenderer,
+    TxtRenderer
+)
+from .response_cache import (
+    cache_anonymous,
+    ingredient_tags,
+    recipe_list_tags,
+    recipe_tags,
+    user_list_tags,
+    user_tags
+)
+from .short_links import click_counter, issue_code, resolve
+from .shopping_list import shopping_list_response
+from .constants import INGREDIENT_SEARCH_LIMIT
+
+
+def object_id(pk):
+    try:
+        return int(pk)
+    except (TypeError, ValueError):
+        raise NotFound()
+
+
+def bulk_links_response(request, model):
+    serializer = BulkIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    statuses = change_links(
+        model,
+        request.user.pk,
+        serializer.validated_data['ids'],
+        add=request.method == 'POST'
+    )
+    return Response({'results': [
+        {'id': pk, 'status': result} for pk, result in statuses.items()
+    ]})
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
-    search_fields = ['^name']
 
+    STATE_AGGREGATES = {
+        'count': Count('id'),
+        'last_id': Max('id'),
+        'updated_at': Max('updated_at'),
+    }
+
+    def catalog_body(self, request):
+        """Готовый JSON из каталога; None — нужен нечёткий поиск в базе."""
+        catalog = get_catalog()
+        name = request.query_params.get('name', '').strip()
+        if not name:
+            return catalog.version, catalog.all()
+        body, found = catalog.search(name, INGREDIENT_SEARCH_LIMIT)
+        if found < INGREDIENT_SEARCH_LIMIT and IngredientFilter.is_fuzzy(
+            name
+        ):
+            body = None
+        return catalog.version, body
+
+    def catalog_response(self, body):
+        return HttpResponse(body, content_type='application/json')
+
+    @cache_anonymous(ingredient_tags)
+    def list(self, request, *args, **kwargs):
+        version, body = self.catalog_body(request)
+        if body is not None:
+            return self.conditional_response(
+                version, lambda: self.catalog_response(body)
+            )
+
+        state = self.filter_queryset(self.get_queryset()).aggregate(
+            **self.STATE_AGGREGATES
+        )
+        return self.conditional_response(
+            tuple(state.values()),
+            lambda: super(IngredientViewSet, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    @cache_anonymous(ingredient_tags)
+    async def alist(self, request, *args, **kwargs):
+        version, body = await sync_to_async(self.catalog_body)(request)
+        if body is not None:
+            return await self.aconditional_response(
+                version, lambda: self.catalog_response(body)
+            )
+
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset()
+        )
+        state = await queryset.aaggregate(**self.STATE_AGGREGATES)
+        return await self.aconditional_response(
+            tuple(state.values()),
+            lambda: super(IngredientViewSet, self).list(
+                request, *args, **kwargs
+            )
+        )
+
+    def state_queryset(self, pk):
+        return self.get_queryset().filter(pk=object_id(pk)).values_list(
+            'updated_at', flat=True
+        )
+
+    @cache_anonymous(ingredient_tags)
+    def retrieve(self, request, *args, **kwargs):
+        updated_at = self.state_queryset(kwargs['pk']).first()
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            updated_at,
+            lambda: super(IngredientViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            last_modified=updated_at
+        )
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    @cache_anonymous(ingredient_tags)
+    async def aretrieve(self, request, *args, **kwargs):
+        updated_at = await self.state_queryset(kwargs['pk']).afirst()
+        if updated_at is None:
+            return await sync_to_async(super().retrieve)(
+                request, *args, **kwargs
+            )
+        return await self.aconditional_response(
+            updated_at,
+            lambda: super(IngredientViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            last_modified=updated_at
+        )
+
+
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = Paginator
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     permission_classes = [IsAuthorOrReadOnly]
+    keyset_ordering = ('name', 'id')
+
+    def get_queryset(self):
+        queryset = Recipe.objects.select_related('author').defer(
+            'search_vector'
+        )
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+                is_author_subscribed=Value(False)
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_author_subscribed=Exists(
+                Subscription.objects.filter(
+                    subscriber=user,
+                    author=OuterRef('author')
+                )
+            )
+        )
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return RecipeWriteSerializer
         return RecipeReadSerializer
 
+    def page_state(self, page):
+        return self.paginator.get_state(), [
+            (
+                recipe.pk, recipe.updated_at, recipe.author.updated_at,
+                recipe.is_favorited, recipe.is_in_shopping_cart,
+                recipe.is_author_subscribed
+            )
+            for recipe in page
+        ]
+
+    def page_response(self, page):
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
+    @cache_anonymous(recipe_list_tags)
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(
+            self.filter_queryset(self.get_queryset())
+        )
+        return self.conditional_response(
+            self.page_state(page), lambda: self.page_response(page)
+        )
+
+    @cache_anonymous(recipe_list_tags)
+    async def alist(self, request, *args, **kwargs):
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset()
+        )
+        page = await self.paginator.apaginate_queryset(
+            queryset, request, view=self
+        )
+        return await self.aconditional_response(
+            self.page_state(page), lambda: self.page_response(page)
+        )
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        paginator = FeedPaginator()
+        position, reverse = paginator.decode_cursor(request)
+        try:
+            before = None if position is None else int(position[0])
+        except (TypeError, ValueError):
+            raise NotFound(paginator.invalid_cursor_message)
+        recipe_ids = feed_recipe_ids(
+            request.user, before, reverse,
+            limit=paginator.get_page_size(request) + 1
+        )
+        page = paginator.paginate_queryset(
+            self.get_queryset().filter(pk__in=recipe_ids), request
+        )
+        state = [
+            (
+                recipe.pk, recipe.updated_at, recipe.author.updated_at,
+                recipe.is_favorited, recipe.is_in_shopping_cart
+            )
+            for recipe in page
+        ]
+        return self.conditional_response(
+            ((paginator.has_next, paginator.has_previous), state),
+            lambda: paginator.get_paginated_response(
+                self.get_serializer(page, many=True).data
+            )
+        )
+
+    def state_queryset(self, pk):
+        return self.get_queryset().filter(pk=object_id(pk)).values_list(
+            'updated_at', 'author__updated_at', 'is_favorited',
+            'is_in_shopping_cart', 'is_author_subscribed'
+        )
+
+    @cache_anonymous(recipe_tags)
+    def retrieve(self, request, *args, **kwargs):
+        state = self.state_queryset(kwargs['pk']).first()
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            state,
+            lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            last_modified=max(state[:2])
+        )
+
+    @cache_anonymous(recipe_tags)
+    async def aretrieve(self, request, *args, **kwargs):
+        state = await self.state_queryset(kwargs['pk']).afirst()
+        if state is None:
+            return await sync_to_async(super().retrieve)(
+                request, *args, **kwargs
+            )
+        return await self.aconditional_response(
+            state,
+            lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            last_modified=max(state[:2])
+        )
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
         recipe = self.get_object()
-        short_link = f'({os.getenv("LINK_DOMAIN")}{recipe.pk})'
-        return Response({'short-link': short_link})
+        return Response({
+            'short-link': f'{settings.LINK_DOMAIN}{issue_code(recipe)}'
+        })
 
+    @transaction.atomic
     def _toggle(self, request, pk, model, serializer_class, exists_msg):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = request.user
-        exists = model.objects.filter(user=user, recipe=recipe).exists()
-        if request.method == 'POST':
-            if exists:
-                return Response(
-                    {'error': exists_msg},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            model.objects.create(user=user, recipe=recipe)
-            data = serializer_class(
-                recipe, context={'request': request}
-            ).data
-            return Response(data, status=status.HTTP_201_CREATED)
-        if not exists:
+        recipe_id = object_id(pk)
+        result = change_links(
+            model, request.user.pk, [recipe_id],
+            add=request.method == 'POST'
+        )[recipe_id]
+        if result == NOT_FOUND:
+            raise NotFound()
+        if result in (EXISTS, ABSENT):
             return Response(
                 {'error': exists_msg},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        model.objects.filter(user=user, recipe=recipe).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        if result == DELETED:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        data = serializer_class(
+            Recipe.objects.get(pk=recipe_id), context={'request': request}
+        ).data
+        return Response(data, status=status.HTTP_201_CREATED)
 
     @action(
         detail=True,
@@ -103,43 +377,72 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False,
-        methods=['get'],
+        methods=['post', 'delete'],
+        url_path='favorite',
+        permission_classes=[IsAuthenticated]
+    )
+    @transaction.atomic
+    def favorite_bulk(self, request):
+        return bulk_links_response(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
         permission_classes=[IsAuthenticated]
     )
+    @transaction.atomic
+    def shopping_cart_bulk(self, request):
+        return bulk_links_response(request, Cart)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path='shopping_cart_summary'
+    )
+    def shopping_cart_summary(self, request):
+        ingredients = CartIngredient.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        return Response({
+            'recipes_count': Cart.objects.filter(user=request.user).count(),
+            'ingredients': CartIngredientSerializer(
+                ingredients, many=True
+            ).data
+        })
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[TxtRenderer, CsvRenderer, PdfRenderer],
+        content_negotiation_class=FormatParamNegotiation
+    )
     def download_shopping_cart(self, request):
-        items = Cart.objects.filter(user=request.user)
-        if not items.exists():
+        cart_state = list(Cart.objects.filter(user=request.user).values_list(
+            'recipe_id', 'recipe__updated_at'
+        ).order_by('recipe_id'))
+        if not cart_state:
             return Response(
                 {'error': 'Корзина пуста'},
-                status=status.HTTP_404_NOT_FOUND
+                status=status.HTTP_404_NOT_FOUND,
+                content_type='application/json'
+            )
+        export_format = request.accepted_renderer.format
+        return self.conditional_response(
+            (export_format, cart_state),
+            lambda: shopping_list_response(
+                request.user, export_format, cart_state,
+                stream=not isinstance(request._request, ASGIRequest)
             )
-
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(
-            total_amount=Sum('amount')
-        ).order_by('ingredient__name')
-
-        lines = [
-            f"{item['ingredient__name']}: {item['total_amount']} "
-            f"{item['ingredient__measurement_unit']}"
-            for item in ingredients
-        ]
-        content = "\n".join(lines)
-        return FileResponse(
-            content,
-            as_attachment=True,
-            filename='shopping_list.txt',
-            content_type='text/plain; charset=utf-8'
         )
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     pagination_class = Paginator
+    keyset_ordering = ('username', 'id')
     http_method_names = [
         'get', 'post', 'delete', 'put', 'patch', 'head', 'options'
     ]
@@ -163,14 +466,64 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_object(self):
         return get_object_or_404(User, pk=self.kwargs.get("pk"))
 
+    @cache_anonymous(user_list_tags)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def state_queryset(self, pk):
+        users = User.objects.filter(pk=object_id(pk))
+        if self.request.user.is_authenticated:
+            users = users.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    subscriber=self.request.user,
+                    author=OuterRef('pk')
+                )
+            ))
+        else:
+            users = users.annotate(is_subscribed=Value(False))
+        return users.values_list('updated_at', 'is_subscribed')
+
+    @cache_anonymous(user_tags)
+    def retrieve(self, request, *args, **kwargs):
+        state = self.state_queryset(kwargs['pk']).first()
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            state,
+            lambda: super(UserViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            last_modified=state[0]
+        )
+
+    @cache_anonymous(user_tags)
+    async def aretrieve(self, request, *args, **kwargs):
+        state = await self.state_queryset(kwargs['pk']).afirst()
+        if state is None:
+            return await sync_to_async(super().retrieve)(
+                request, *args, **kwargs
+            )
+        return await self.aconditional_response(
+            state,
+            lambda: super(UserViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            last_modified=state[0]
+        )
+
     @action(
         detail=False,
         methods=['get'],
         permission_classes=[IsAuthenticated]
     )
     def me(self, request):
-        serializer = UserSerializer(request.user, context={'request': request})
-        return Response(serializer.data)
+        return self.conditional_response(
+            (request.user.pk, request.user.updated_at),
+            lambda: Response(UserSerializer(
+                request.user, context={'request': request}
+            ).data),
+            last_modified=request.user.updated_at
+        )
 
     @action(
         detail=False,
@@ -178,6 +531,7 @@ class UserViewSet(viewsets.ModelViewSet):
         url_path='me/avatar',
         permission_classes=[IsAuthenticated],
     )
+    @transaction.atomic
     def avatar(self, request):
         user = request.user
 
@@ -201,6 +555,7 @@ class UserViewSet(viewsets.ModelViewSet):
         )
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        enqueue('users.process_avatar', user_id=user.pk, name=user.avatar.name)
 
         return Response(
             {'avatar': request.build_absolute_uri(user.avatar.url)},
@@ -224,7 +579,7 @@ class UserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         user.set_password(new)
-        user.save()
+        user.save(update_fields=['password'])
         return Response(
             {'status': 'Пароль изменен'},
             status=status.HTTP_204_NO_CONTENT
@@ -237,8 +592,23 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def subscriptions(self, request):
-        authors = User.objects.filter(subscribers__subscriber=request.user)
-        page = self.paginate_queryset(authors)
+        page = self.paginate_queryset(self.subscribed_authors(request))
+        return self.subscriptions_response(request, page)
+
+    async def asubscriptions(self, request):
+        page = await self.paginator.apaginate_queryset(
+            self.subscribed_authors(request), request, view=self
+        )
+        return await sync_to_async(self.subscriptions_response)(
+            request, page
+        )
+
+    def subscribed_authors(self, request):
+        return User.objects.filter(
+            subscribers__subscriber=request.user
+        ).annotate(is_subscribed=Value(True)).order_by(*self.keyset_ordering)
+
+    def subscriptions_response(self, request, page):
         serializer = SubscriptionSerializer(
             page,
             many=True,
@@ -252,46 +622,47 @@ class UserViewSet(viewsets.ModelViewSet):
         url_path='subscribe',
         permission_classes=[IsAuthenticated]
     )
+    @transaction.atomic
     def subscribe(self, request, pk=None):
-        subscriber = request.user
-        author = get_object_or_404(User, pk=pk)
-
-        if author == subscriber:
+        author_id = object_id(pk)
+        result = change_links(
+            Subscription, request.user.pk, [author_id],
+            add=request.method == 'POST'
+        )[author_id]
+        errors = {
+            SELF: 'Нельзя подписаться на себя',
+            EXISTS: 'Вы уже подписаны',
+            ABSENT: 'Нельзя отписаться, подписка не найдена',
+        }
+        if result == NOT_FOUND:
+            raise NotFound()
+        if result in errors:
             return Response(
-                {'error': 'Нельзя подписаться на себя'},
+                {'error': errors[result]},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if result == DELETED:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        data = SubscriptionSerializer(
+            User.objects.get(pk=author_id),
+            context={'request': request}
+        ).data
+        return Response(data, status=status.HTTP_201_CREATED)
 
-        subscription_exists = Subscription.objects.filter(
-            subscriber=subscriber,
-            author=author
-        ).exists()
-
-        if request.method == 'POST':
-            if subscription_exists:
-                return Response(
-                    {'error': 'Вы уже подписаны'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            Subscription.objects.create(subscriber=subscriber, author=author)
-            data = SubscriptionSerializer(
-                author,
-                context={'request': request}
-            ).data
-            return Response(data, status=status.HTTP_201_CREATED)
-
-        if not subscription_exists:
-            return Response(
-                {'error': 'Нельзя отписаться, подписка не найдена'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        Subscription.objects.filter(
-            subscriber=subscriber,
-            author=author
-        ).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='subscribe',
+        permission_classes=[IsAuthenticated]
+    )
+    @transaction.atomic
+    def subscribe_bulk(self, request):
+        return bulk_links_response(request, Subscription)
 
 
-def redirect_to_recipe(request, pk):
-    get_object_or_404(Recipe, pk=pk)
-    return redirect(f'/api/recipes/{pk}/')
+def redirect_to_recipe(request, code):
+    recipe_id = resolve(code)
+    if recipe_id is None:
+        raise Http404
+    click_counter.add(recipe_id)
+    return redirect(f'/api/recipes/{recipe_id}/')
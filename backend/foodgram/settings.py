@@ -33,6 +33,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'rest_framework',
     'django_filters',
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     'djoser',
     'users',
     'recipes',
+    'tasks',
     'test_media'
 ]
 
@@ -130,12 +132,49 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+INGREDIENT_CATALOG_PATH = os.getenv(
+    'INGREDIENT_CATALOG_PATH',
+    os.path.join(BASE_DIR, 'var', 'ingredients.catalog')
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Очистка по тегам должна дойти до всех процессов gunicorn, поэтому
+    # по умолчанию файловый кэш; LocMemCache годится для одного процесса.
+    'responses': {
+        'BACKEND': os.getenv(
+            'RESPONSE_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'RESPONSE_CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'var', 'response_cache')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 10_000},
+    },
+}
+
+# Алиас из CACHES для кэша ответов анонимам; пусто — кэш выключен.
+RESPONSE_CACHE = os.getenv('RESPONSE_CACHE', 'responses')
+
+# Асинхронные представления для чтения; включается в foodgram/asgi.py.
+ASYNC_READ_PATH = os.getenv('ASYNC_READ_PATH', 'False') == 'True'
+
+# Алиас из CACHES, общий для процессов; пусто — только кэш процесса.
+TOKEN_AUTH_CACHE = os.getenv('TOKEN_AUTH_CACHE', '')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
 }
 
@@ -1,4 +1,4 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.contrib import admin
 
 from api.views import redirect_to_recipe
@@ -7,5 +7,5 @@ from api.views import redirect_to_recipe
 urlpatterns = [
     path('api/', include('api.urls')),
     path('admin/', admin.site.urls),
-    path('s/<int:pk>', redirect_to_recipe),
+    re_path(r'^s/(?P<code>[0-9A-Za-z]+)$', redirect_to_recipe),
 ]
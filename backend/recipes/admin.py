@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django import forms
 
+from .cart_totals import change_recipe_totals, diff_amounts, recipe_amounts
 from .models import (
     Recipe,
     Ingredient,
@@ -39,23 +40,36 @@ class RecipeAdminForm(forms.ModelForm):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     form = RecipeAdminForm
-    list_display = ('name', 'author', 'cooking_time', 'favorites_count',)
+    list_display = (
+        'name', 'author', 'cooking_time', 'favorites_count', 'carts_count'
+    )
     search_fields = ('name', 'author__username', 'author__email')
     list_filter = ('author',)
-    readonly_fields = ('favorites_count',)
+    list_select_related = ('author',)
+    readonly_fields = (
+        'favorites_count', 'carts_count', 'short_code', 'clicks_count'
+    )
     inlines = (RecipeIngredientInline,)
     fieldsets = (
         (None, {
             'fields': ('author', 'name', 'image', 'text')
         }),
         ('Детали', {
-            'fields': ('cooking_time', 'favorites_count')
+            'fields': ('cooking_time', 'favorites_count', 'carts_count')
+        }),
+        ('Короткая ссылка', {
+            'fields': ('short_code', 'clicks_count')
         }),
     )
 
-    def favorites_count(self, obj):
-        return obj.favorites.count()
-    favorites_count.short_description = 'В избранном'
+    def save_related(self, request, form, formsets, change):
+        old_amounts = recipe_amounts(form.instance.pk) if change else {}
+        super().save_related(request, form, formsets, change)
+        Recipe.objects.filter(pk=form.instance.pk).touch()
+        if change:
+            change_recipe_totals(form.instance.pk, diff_amounts(
+                old_amounts, recipe_amounts(form.instance.pk)
+            ))
 
 
 @admin.register(Ingredient)
@@ -64,10 +78,12 @@ class IngredientAdmin(admin.ModelAdmin):
     search_fields = ('name', 'measurement_unit')
     list_filter = ('measurement_unit',)
     list_per_page = ADMIN_LIST_PER_PAGE
+    readonly_fields = ('recipes_count',)
 
-    def recipes_count(self, obj):
-        return obj.recipes.count()
-    recipes_count.short_description = 'Используется в рецептах'
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            Recipe.objects.filter(ingredients=obj).touch()
 
 
 @admin.register(Cart)
@@ -91,3 +107,31 @@ class RecipeIngredientAdmin(admin.ModelAdmin):
     list_filter = ('recipe', 'ingredient')
     autocomplete_fields = ('recipe', 'ingredient')
     list_select_related = ('recipe', 'ingredient')
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.add(form.initial.get('recipe'))
+        old_amounts = {pk: recipe_amounts(pk) for pk in recipe_ids}
+        super().save_model(request, obj, form, change)
+        Recipe.objects.filter(pk__in=recipe_ids).touch()
+        for pk, amounts in old_amounts.items():
+            change_recipe_totals(
+                pk, diff_amounts(amounts, recipe_amounts(pk))
+            )
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        Recipe.objects.filter(pk=obj.recipe_id).touch()
+        change_recipe_totals(obj.recipe_id, {obj.ingredient_id: -obj.amount})
+
+    def delete_queryset(self, request, queryset):
+        removed = list(queryset.values_list(
+            'recipe_id', 'ingredient_id', 'amount'
+        ))
+        super().delete_queryset(request, queryset)
+        Recipe.objects.filter(
+            pk__in={recipe_id for recipe_id, _, _ in removed}
+        ).touch()
+        for recipe_id, ingredient_id, amount in removed:
+            change_recipe_totals(recipe_id, {ingredient_id: -amount})
@@ -0,0 +1,149 @@
+"""Итоги корзины покупок по ингредиентам, которые поддерживаются на записи.
+
+Строка `CartIngredient` хранит сумму количества ингредиента по всем
+рецептам в корзине пользователя. Добавление и удаление рецепта из
+корзины, а также правка состава рецепта меняют итоги на разницу, поэтому
+список покупок читается без агрегации по `RecipeIngredient`.
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from users.models import User
+from .models import Cart, CartIngredient, RecipeIngredient
+
+
+def recipe_amounts(recipe_id):
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            'ingredient_id', 'amount'
+        )
+    )
+
+
+def diff_amounts(old, new):
+    return {
+        pk: new.get(pk, 0) - old.get(pk, 0)
+        for pk in old.keys() | new.keys()
+        if new.get(pk, 0) != old.get(pk, 0)
+    }
+
+
+def negate(amounts):
+    return {pk: -amount for pk, amount in amounts.items()}
+
+
+def lock_users(users):
+    """Блокирует строки пользователей до конца транзакции.
+
+    Все изменения итогов корзины сначала берут эту блокировку, поэтому
+    чтение и запись итогов одного пользователя не перемежаются и две
+    вставки одного ингредиента не сталкиваются. Порядок по pk исключает
+    взаимные блокировки при правке рецепта в нескольких корзинах.
+    """
+    return list(
+        User.objects.select_for_update().filter(pk__in=users).order_by(
+            'pk'
+        ).values_list('pk', flat=True)
+    )
+
+
+@transaction.atomic(savepoint=False)
+def change_user_totals(user_id, deltas):
+    if not deltas:
+        return
+    lock_users([user_id])
+    rows = {
+        row.ingredient_id: row
+        for row in CartIngredient.objects.filter(
+            user_id=user_id, ingredient_id__in=deltas
+        )
+    }
+    created, changed, emptied = [], [], []
+    for ingredient_id, delta in deltas.items():
+        row = rows.get(ingredient_id)
+        if row is None:
+            if delta > 0:
+                created.append(CartIngredient(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=delta
+                ))
+        elif row.total_amount + delta > 0:
+            row.total_amount += delta
+            changed.append(row)
+        else:
+            emptied.append(row.pk)
+    if created:
+        CartIngredient.objects.bulk_create(created)
+    if changed:
+        CartIngredient.objects.bulk_update(changed, ['total_amount'])
+    if emptied:
+        CartIngredient.objects.filter(pk__in=emptied).delete()
+
+
+@transaction.atomic(savepoint=False)
+def change_recipe_totals(recipe_id, deltas):
+    """Переносит правку состава рецепта во все корзины с этим рецептом.
+
+    Запросов здесь по два-три на изменённый ингредиент и одна блокировка
+    владельцев корзин, а не по запросу на каждого владельца.
+    """
+    if not deltas:
+        return
+    holders = lock_users(
+        Cart.objects.filter(recipe_id=recipe_id).values('user_id')
+    )
+    if not holders:
+        return
+    for ingredient_id, delta in deltas.items():
+        rows = CartIngredient.objects.filter(
+            ingredient_id=ingredient_id, user_id__in=holders
+        )
+        rows.update(total_amount=Greatest(F('total_amount') + delta, 0))
+        if delta > 0:
+            missing = set(holders).difference(rows.values_list(
+                'user_id', flat=True
+            ))
+            CartIngredient.objects.bulk_create([
+                CartIngredient(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=delta
+                ) for user_id in missing
+            ])
+        else:
+            rows.filter(total_amount=0).delete()
+
+
+def actual_totals():
+    return RecipeIngredient.objects.filter(
+        recipe__cart__isnull=False
+    ).values_list(
+        'recipe__cart__user_id', 'ingredient_id'
+    ).annotate(total=Sum('amount')).order_by()
+
+
+def find_mismatches():
+    actual = {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in actual_totals().iterator()
+    }
+    stored = CartIngredient.objects.values_list(
+        'user_id', 'ingredient_id', 'total_amount'
+    ).order_by()
+    mismatches = {}
+    for user_id, ingredient_id, total in stored.iterator():
+        expected = actual.pop((user_id, ingredient_id), 0)
+        if expected != total:
+            mismatches[user_id, ingredient_id] = (total, expected)
+    for key, expected in actual.items():
+        mismatches[key] = (0, expected)
+    return mismatches
+
+
+def rebuild():
+    mismatches = find_mismatches()
+    for (user_id, ingredient_id), (stored, expected) in mismatches.items():
+        change_user_totals(user_id, {ingredient_id: expected - stored})
+    return len(mismatches)
@@ -3,5 +3,22 @@ MIN_COOKING_TIME = 1
 MAX_RECIPE_NAME_LENGTH = 100
 MAX_INGREDIENT_NAME_LENGTH = 100
 MAX_MEASUREMENT_UNIT_LENGTH = 20
+SHORT_CODE_LENGTH = 6
 
 ADMIN_LIST_PER_PAGE = 50
+
+SEARCH_CONFIGS = ('russian', 'english')
+
+FEED_FANOUT_MAX_SUBSCRIBERS = 1_000
+FEED_BACKFILL_LIMIT = 100
+
+IMAGE_VARIANT_WIDTHS = {'thumbnail': 160, 'card': 480, 'full': 1280}
+IMAGE_VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+}
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_VARIANTS_DIR = 'recipes/variants/'
+
+RECIPE_EXPORT_CHUNK_SIZE = 2_000
+RECIPE_IMPORT_BATCH_SIZE = 500
@@ -0,0 +1,44 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Subscription, User
+from .models import Cart, Favorite, Ingredient, Recipe, RecipeIngredient
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', Cart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+    (Ingredient, 'recipes_count', RecipeIngredient, 'ingredient'),
+)
+
+
+def actual_count(source, relation):
+    return Coalesce(Subquery(
+        source.objects.filter(**{relation: OuterRef('pk')}).order_by().values(
+            relation
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def find_mismatches(model, field, source, relation):
+    return model.objects.annotate(
+        actual=actual_count(source, relation)
+    ).exclude(**{field: F('actual')})
+
+
+def rebuild(model, field, source, relation):
+    pks = list(
+        find_mismatches(model, field, source, relation).values_list(
+            'pk', flat=True
+        )
+    )
+    if pks:
+        model.objects.filter(pk__in=pks).update(
+            **{field: actual_count(source, relation)}
+        )
+    return len(pks)
+
+
+def adjust(queryset, field, delta):
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
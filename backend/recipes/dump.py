@@ -0,0 +1,176 @@
+"""Выгрузка и загрузка рецептов в NDJSON: одна строка — один рецепт.
+
+Автор записывается логином и профилем, ингредиенты — названием и единицей
+измерения, поэтому файл не зависит от первичных ключей базы. При загрузке
+рецепты получают новые id, а недостающие авторы и ингредиенты создаются.
+Файлы изображений не переносятся: в выгрузке только путь в хранилище.
+"""
+import gzip
+import json
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Prefetch
+
+from users.models import User
+from .counters import adjust
+from .feed import fan_out
+from .models import Ingredient, Recipe, RecipeIngredient
+
+AUTHOR_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
+
+def open_dump(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, f'{mode}t', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def recipe_to_dict(recipe):
+    return {
+        'id': recipe.pk,
+        'author': {
+            field: getattr(recipe.author, field) for field in AUTHOR_FIELDS
+        },
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'image': recipe.image.name,
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount
+            }
+            for item in recipe.recipe_ingredients.all()
+        ],
+    }
+
+
+def export_recipes(file, chunk_size):
+    """Пишет все рецепты, держа в памяти не больше `chunk_size` штук.
+
+    На PostgreSQL `iterator()` читает через серверный курсор, а
+    ингредиенты подгружаются одним запросом на каждую пачку рецептов.
+    """
+    recipes = Recipe.objects.select_related('author').defer(
+        'search_vector'
+    ).prefetch_related(Prefetch(
+        'recipe_ingredients',
+        queryset=RecipeIngredient.objects.select_related(
+            'ingredient'
+        ).order_by('id')
+    )).order_by('pk')
+    count = 0
+    for recipe in recipes.iterator(chunk_size=chunk_size):
+        file.write(json.dumps(recipe_to_dict(recipe), ensure_ascii=False))
+        file.write('\n')
+        count += 1
+    return count
+
+
+def resolve_authors(records):
+    profiles = {
+        record['author']['username']: record['author'] for record in records
+    }
+    authors = User.objects.in_bulk(list(profiles), field_name='username')
+    missing = [
+        User(
+            **{field: profile[field] for field in AUTHOR_FIELDS},
+            password=make_password(None)
+        )
+        for username, profile in profiles.items()
+        if username not in authors
+    ]
+    User.objects.bulk_create(missing)
+    authors.update((author.username, author) for author in missing)
+    return authors
+
+
+def resolve_ingredients(records):
+    pairs = {
+        (item['name'], item['measurement_unit'])
+        for record in records for item in record['ingredients']
+    }
+
+    def fetch():
+        return {
+            (name, unit): pk
+            for pk, name, unit in Ingredient.objects.filter(
+                name__in={name for name, _ in pairs}
+            ).values_list('id', 'name', 'measurement_unit')
+            if (name, unit) in pairs
+        }
+
+    ingredients = fetch()
+    missing = pairs - set(ingredients)
+    if not missing:
+        return ingredients, 0
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name, measurement_unit=unit)
+         for name, unit in missing],
+        ignore_conflicts=True
+    )
+    return fetch(), len(missing)
+
+
+def add_counts(model, field, counts):
+    by_delta = defaultdict(list)
+    for pk, delta in counts.items():
+        by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        adjust(model.objects.filter(pk__in=pks), field, delta)
+
+
+@transaction.atomic
+def load_batch(records):
+    """Загружает пачку рецептов; возвращает пары (старый id, новый id).
+
+    Вставки идут через `bulk_create`, сигналы не срабатывают, поэтому
+    счётчики и ленты подписчиков обновляются здесь же.
+    """
+    authors = resolve_authors(records)
+    ingredients, created_ingredients = resolve_ingredients(records)
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            author=authors[record['author']['username']],
+            name=record['name'],
+            text=record['text'],
+            cooking_time=record['cooking_time'],
+            image=record['image'] or ''
+        )
+        for record in records
+    ])
+    links = RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient_id=ingredients[
+                item['name'], item['measurement_unit']
+            ],
+            amount=item['amount']
+        )
+        for recipe, record in zip(recipes, records)
+        for item in record['ingredients']
+    ])
+    add_counts(User, 'recipes_count', Counter(
+        recipe.author_id for recipe in recipes
+    ))
+    add_counts(Ingredient, 'recipes_count', Counter(
+        link.ingredient_id for link in links
+    ))
+    for recipe in recipes:
+        if recipe.author.subscribers_count:
+            fan_out(recipe)
+    return [
+        (record.get('id'), recipe.pk)
+        for record, recipe in zip(records, recipes)
+    ], created_ingredients
+
+
+def import_recipes(file, batch_size):
+    """Загружает рецепты пачками, каждую в своей транзакции."""
+    records = (json.loads(line) for line in file if line.strip())
+    while batch := list(islice(records, batch_size)):
+        yield load_batch(batch)
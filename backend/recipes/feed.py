@@ -0,0 +1,87 @@
+"""Лента рецептов от авторов, на которых подписан пользователь.
+
+Новый рецепт автора с небольшим числом подписчиков сразу раскладывается
+по их лентам (`FeedItem`). Рецепты авторов, у которых подписчиков больше
+`FEED_FANOUT_MAX_SUBSCRIBERS`, в ленты не пишутся, а подмешиваются при
+чтении прямо из `Recipe`. Если такой автор потом теряет подписчиков и
+опускается ниже порога, его рецепты, опубликованные за это время, в
+ленте уже не появятся.
+"""
+from django.db import connection
+
+from users.models import Subscription, User
+from .constants import FEED_BACKFILL_LIMIT, FEED_FANOUT_MAX_SUBSCRIBERS
+from .models import FeedItem, Recipe
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def fan_out(recipe):
+    if recipe.author.subscribers_count > FEED_FANOUT_MAX_SUBSCRIBERS:
+        return
+    quote = connection.ops.quote_name
+    _execute(
+        f'INSERT INTO {quote(FeedItem._meta.db_table)} '
+        f'(user_id, recipe_id, author_id) '
+        f'SELECT subscriber_id, %s, author_id '
+        f'FROM {quote(Subscription._meta.db_table)} WHERE author_id = %s '
+        f'ON CONFLICT DO NOTHING',
+        [recipe.pk, recipe.author_id]
+    )
+
+
+def backfill(user_id, author_ids):
+    """Добавляет в ленту последние рецепты новых авторов одним запросом."""
+    author_ids = list(User.objects.filter(
+        pk__in=author_ids,
+        subscribers_count__lte=FEED_FANOUT_MAX_SUBSCRIBERS
+    ).values_list('pk', flat=True))
+    if not author_ids:
+        return
+    quote = connection.ops.quote_name
+    _execute(
+        f'INSERT INTO {quote(FeedItem._meta.db_table)} '
+        f'(user_id, recipe_id, author_id) '
+        f'SELECT %s, id, author_id FROM ('
+        f'SELECT id, author_id, ROW_NUMBER() OVER ('
+        f'PARTITION BY author_id ORDER BY id DESC) AS position '
+        f'FROM {quote(Recipe._meta.db_table)} '
+        f'WHERE author_id IN ({_placeholders(author_ids)})'
+        f') ranked WHERE position <= %s '
+        f'ON CONFLICT DO NOTHING',
+        [user_id, *author_ids, FEED_BACKFILL_LIMIT]
+    )
+
+
+def trim(user_id, author_ids):
+    FeedItem.objects.filter(user_id=user_id, author_id__in=author_ids).delete()
+
+
+def feed_recipe_ids(user, position=None, reverse=False, limit=None):
+    """Идентификаторы рецептов ленты, ближайшие к курсору, по убыванию.
+
+    Объединяет записанную ленту и рецепты «крупных» авторов; оба запроса
+    идут по индексам и ограничены `limit`, так что результат — точный
+    верх ленты, а не выборка из всей истории.
+    """
+    lookup = 'gt' if reverse else 'lt'
+    pushed = FeedItem.objects.filter(user=user).values_list(
+        'recipe_id', flat=True
+    ).order_by('recipe_id' if reverse else '-recipe_id')
+    pulled = Recipe.objects.filter(
+        author__subscribers__subscriber=user,
+        author__subscribers_count__gt=FEED_FANOUT_MAX_SUBSCRIBERS
+    ).values_list('id', flat=True).order_by('id' if reverse else '-id')
+    if position is not None:
+        pushed = pushed.filter(**{f'recipe_id__{lookup}': position})
+        pulled = pulled.filter(**{f'id__{lookup}': position})
+    if limit is not None:
+        pushed, pulled = pushed[:limit], pulled[:limit]
+    return sorted(set(pushed) | set(pulled), reverse=not reverse)[:limit]
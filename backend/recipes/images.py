@@ -0,0 +1,134 @@
+"""Уменьшенные копии изображений рецептов в WebP и JPEG.
+
+`render_variants` работает только с байтами и Pillow, поэтому её можно
+запускать в отдельных процессах; сохранение файлов и запись в базу
+делает `save_variants` в основном процессе. Модуль не импортирует модели,
+чтобы его можно было загрузить в процессе без настроенного Django.
+
+При сохранении рецепта копии строятся не в запросе, а задачей
+`recipes.build_image_variants` из очереди `tasks`.
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .constants import (
+    IMAGE_VARIANT_FORMATS,
+    IMAGE_VARIANT_QUALITY,
+    IMAGE_VARIANT_WIDTHS,
+    IMAGE_VARIANTS_DIR
+)
+
+logger = logging.getLogger(__name__)
+
+
+def render_variants(source):
+    """Возвращает `{(размер, формат): (ширина, байты)}` для всех вариантов."""
+    with Image.open(io.BytesIO(source)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        image.load()
+    variants = {}
+    for size, width in IMAGE_VARIANT_WIDTHS.items():
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        for name, (pil_format, _, _) in IMAGE_VARIANT_FORMATS.items():
+            frame = resized
+            if pil_format == 'JPEG' and frame.mode != 'RGB':
+                background = Image.new('RGB', frame.size, 'white')
+                background.paste(frame, mask=frame.getchannel('A'))
+                frame = background
+            output = io.BytesIO()
+            frame.save(
+                output, pil_format, quality=IMAGE_VARIANT_QUALITY,
+                optimize=pil_format == 'JPEG'
+            )
+            variants[size, name] = (resized.width, output.getvalue())
+    return variants
+
+
+def needs_variants(recipe):
+    return bool(recipe.image) and (
+        recipe.image_variants.get('source') != recipe.image.name
+    )
+
+
+def save_variants(recipe, rendered):
+    stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    variants = {'source': recipe.image.name}
+    for (size, name), (width, content) in rendered.items():
+        extension = IMAGE_VARIANT_FORMATS[name][1]
+        path = default_storage.save(
+            f'{IMAGE_VARIANTS_DIR}{stem}-{size}.{extension}',
+            ContentFile(content)
+        )
+        variants.setdefault(size, {'width': width})[name] = path
+    # Пока копии строились, изображение рецепта могли заменить.
+    if not type(recipe).objects.filter(
+        pk=recipe.pk, image=recipe.image.name
+    ).update(image_variants=variants, updated_at=timezone.now()):
+        delete_variants(variants)
+        return False
+    delete_variants(recipe.image_variants)
+    recipe.image_variants = variants
+    return True
+
+
+def delete_variants(variants):
+    for size in IMAGE_VARIANT_WIDTHS:
+        for name in IMAGE_VARIANT_FORMATS:
+            path = variants.get(size, {}).get(name)
+            if path:
+                default_storage.delete(path)
+
+
+def read_image(recipe):
+    recipe.image.open('rb')
+    try:
+        return recipe.image.read()
+    finally:
+        recipe.image.close()
+
+
+def build_variants(recipe):
+    if not needs_variants(recipe):
+        return
+    try:
+        rendered = render_variants(read_image(recipe))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Без вариантов API отдаёт исходный файл, запись рецепта не ломаем.
+        logger.exception('Не удалось уменьшить изображение %s', recipe.pk)
+        return
+    save_variants(recipe, rendered)
+
+
+def variant_url(variants, size, name='jpeg'):
+    path = variants.get(size, {}).get(name)
+    return default_storage.url(path) if path else None
+
+
+def srcset(variants, name, build_url):
+    candidates = {}
+    for size in IMAGE_VARIANT_WIDTHS:
+        url = variant_url(variants, size, name)
+        if url:
+            # Маленький оригинал даёт одинаковые по ширине копии.
+            candidates.setdefault(variants[size]['width'], url)
+    return ', '.join(
+        f'{build_url(url)} {width}w' for width, url in candidates.items()
+    )
+
+
+def image_srcset(variants, build_url):
+    if not any(size in variants for size in IMAGE_VARIANT_WIDTHS):
+        return None
+    return {
+        content_type: srcset(variants, name, build_url)
+        for name, (_, _, content_type) in IMAGE_VARIANT_FORMATS.items()
+    }
@@ -0,0 +1,126 @@
+"""Связи пользователя с рецептами и авторами: избранное, корзина, подписки.
+
+Вставка и удаление делаются одним запросом на пачку идентификаторов через
+`ON CONFLICT DO NOTHING ... RETURNING`, поэтому повторный запрос и гонка
+двух запросов не приводят ни к дублю, ни к ошибке. Сигналы моделей при
+этом не срабатывают, поэтому счётчики, итоги корзины и ленты подписок
+обновляются здесь же по фактически вставленным и удалённым строкам.
+"""
+from django.db import connection
+from django.db.models import Sum
+
+from users.models import Subscription
+from .cart_totals import change_user_totals, negate
+from .counters import COUNTERS, adjust
+from .feed import backfill, trim
+from .models import Cart, Favorite, RecipeIngredient
+
+LINKS = {
+    Favorite: ('user', 'recipe'),
+    Cart: ('user', 'recipe'),
+    Subscription: ('subscriber', 'author'),
+}
+
+CREATED = 'created'
+EXISTS = 'exists'
+DELETED = 'deleted'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+
+def _columns(model):
+    owner_field, target_field = LINKS[model]
+    meta = model._meta
+    return (
+        meta.db_table,
+        meta.get_field(owner_field).column,
+        meta.get_field(target_field).column,
+        meta.get_field(target_field).related_model
+    )
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def link(model, owner_id, target_ids):
+    table, owner, target, target_model = _columns(model)
+    quote = connection.ops.quote_name
+    target_pk = quote(target_model._meta.pk.column)
+    return _execute(
+        f'INSERT INTO {quote(table)} ({quote(owner)}, {quote(target)}) '
+        f'SELECT %s, {target_pk} FROM {quote(target_model._meta.db_table)} '
+        f'WHERE {target_pk} IN ({", ".join(["%s"] * len(target_ids))}) '
+        f'ON CONFLICT DO NOTHING RETURNING {quote(target)}',
+        [owner_id, *target_ids]
+    )
+
+
+def unlink(model, owner_id, target_ids):
+    table, owner, target, _ = _columns(model)
+    quote = connection.ops.quote_name
+    return _execute(
+        f'DELETE FROM {quote(table)} WHERE {quote(owner)} = %s '
+        f'AND {quote(target)} IN ({", ".join(["%s"] * len(target_ids))}) '
+        f'RETURNING {quote(target)}',
+        [owner_id, *target_ids]
+    )
+
+
+def after_change(model, owner_id, target_ids, delta):
+    target_field = LINKS[model][1]
+    for counter_model, field, source, relation in COUNTERS:
+        if source is model and relation == target_field:
+            adjust(
+                counter_model.objects.filter(pk__in=target_ids), field, delta
+            )
+    if model is Cart:
+        amounts = dict(RecipeIngredient.objects.filter(
+            recipe_id__in=target_ids
+        ).values_list('ingredient_id').annotate(
+            total=Sum('amount')
+        ).order_by())
+        change_user_totals(
+            owner_id, amounts if delta > 0 else negate(amounts)
+        )
+    if model is Subscription:
+        (backfill if delta > 0 else trim)(owner_id, target_ids)
+
+
+def change_links(model, owner_id, target_ids, add):
+    """Добавляет или удаляет связи и возвращает статус по каждому id.
+
+    Вызывается внутри транзакции, чтобы связи и счётчики менялись вместе.
+    """
+    owner_field, target_field = LINKS[model]
+    target_model = model._meta.get_field(target_field).related_model
+    self_link = target_model is model._meta.get_field(
+        owner_field
+    ).related_model
+    target_ids = list(dict.fromkeys(target_ids))
+    candidates = [
+        pk for pk in target_ids if not (self_link and pk == owner_id)
+    ]
+    changed = set()
+    if candidates:
+        changed = (link if add else unlink)(model, owner_id, candidates)
+    if changed:
+        after_change(model, owner_id, changed, 1 if add else -1)
+    rest = [pk for pk in candidates if pk not in changed]
+    found = set(target_model.objects.filter(pk__in=rest).values_list(
+        'pk', flat=True
+    )) if rest else set()
+    statuses = {}
+    for pk in target_ids:
+        if self_link and pk == owner_id:
+            statuses[pk] = SELF
+        elif pk in changed:
+            statuses[pk] = CREATED if add else DELETED
+        elif pk in found:
+            statuses[pk] = EXISTS if add else ABSENT
+        else:
+            statuses[pk] = NOT_FOUND
+    return statuses
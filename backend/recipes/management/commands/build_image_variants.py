@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import (
+    needs_variants,
+    read_image,
+    render_variants,
+    save_variants
+)
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные копии изображений рецептов в нескольких '
+        'процессах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов для обработки изображений'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перестроить варианты и у тех рецептов, где они уже есть'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'] or 1)
+        recipes = (
+            recipe for recipe in Recipe.objects.exclude(image='').only(
+                'id', 'image', 'image_variants'
+            ).order_by('pk').iterator(chunk_size=100)
+            if options['all'] or needs_variants(recipe)
+        )
+        self.built = self.failed = 0
+        # spawn: дочерние процессы не наследуют соединение с базой.
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            pending = {}
+            for recipe in recipes:
+                if len(pending) >= workers * 2:
+                    pending = self.collect(pending, FIRST_COMPLETED)
+                try:
+                    source = read_image(recipe)
+                except OSError as error:
+                    self.fail(recipe, error)
+                    continue
+                pending[executor.submit(render_variants, source)] = recipe
+            self.collect(pending)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {self.built}, с ошибками: {self.failed}'
+        ))
+
+    def collect(self, pending, return_when='ALL_COMPLETED'):
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            recipe = pending.pop(future)
+            try:
+                save_variants(recipe, future.result())
+            except Exception as error:
+                self.fail(recipe, error)
+            else:
+                self.built += 1
+        return pending
+
+    def fail(self, recipe, error):
+        self.failed += 1
+        self.stderr.write(f'Рецепт {recipe.pk}: {error}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.cart_totals import find_mismatches, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Сверяет итоги корзин покупок с составом рецептов в корзинах'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить итоги, ничего не изменяя'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            count = len(find_mismatches())
+        else:
+            with transaction.atomic():
+                count = rebuild()
+        self.stdout.write(f'recipes.CartIngredient: расхождений {count}')
+        if options['check'] and count:
+            raise CommandError(
+                f'Найдено расхождений: {count}', returncode=1
+            )
+        self.stdout.write(self.style.SUCCESS('Итоги корзин в порядке'))
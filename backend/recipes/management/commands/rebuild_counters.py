@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import COUNTERS, find_mismatches, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики популярности'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счётчики, ничего не изменяя'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for model, field, source, relation in COUNTERS:
+            label = f'{model._meta.label}.{field}'
+            if options['check']:
+                count = find_mismatches(model, field, source, relation).count()
+            else:
+                with transaction.atomic():
+                    count = rebuild(model, field, source, relation)
+            total += count
+            self.stdout.write(f'{label}: расхождений {count}')
+        if options['check'] and total:
+            raise CommandError(
+                f'Найдено расхождений: {total}', returncode=1
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики в порядке'))
@@ -0,0 +1,37 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+CREATE_INDEXES = """
+CREATE INDEX IF NOT EXISTS ingredient_name_prefix_idx
+ON recipes_ingredient (lower(name) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS ingredient_name_trgm_idx
+ON recipes_ingredient USING gin (lower(name) gin_trgm_ops);
+"""
+
+DROP_INDEXES = """
+DROP INDEX IF EXISTS ingredient_name_prefix_idx;
+DROP INDEX IF EXISTS ingredient_name_trgm_idx;
+"""
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEXES)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEXES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
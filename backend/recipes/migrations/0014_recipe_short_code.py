@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='clicks_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Переходов по короткой ссылке'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='short_code',
+            field=models.CharField(blank=True, editable=False, max_length=6, null=True, unique=True, verbose_name='Короткий код'),
+        ),
+    ]
@@ -1,16 +1,48 @@
-from django.db import models
-from users.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.db import connection, models
+from django.utils import timezone
+from users.models import CounterFieldsMixin, User
 from django.core.validators import MinValueValidator
 
 from .constants import (
     MIN_COOKING_TIME,
     MAX_RECIPE_NAME_LENGTH,
     MAX_INGREDIENT_NAME_LENGTH,
-    MAX_MEASUREMENT_UNIT_LENGTH
+    MAX_MEASUREMENT_UNIT_LENGTH,
+    SHORT_CODE_LENGTH
 )
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    def touch(self):
+        return self.update(updated_at=timezone.now())
+
+    def latest_by_author(self, author_ids, limit=None):
+        """Последние `limit` рецептов каждого автора одним запросом.
+
+        Окно `ROW_NUMBER()` нумерует рецепты внутри автора; Django 4.1 не
+        умеет фильтровать по оконной функции, поэтому запрос написан
+        вручную. Загружаются только поля краткого представления рецепта.
+        """
+        author_ids = list(author_ids)
+        if not author_ids:
+            return []
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        columns = 'id, author_id, name, image, image_variants, cooking_time'
+        position = '' if limit is None else 'WHERE position <= %s'
+        return self.raw(
+            f'SELECT {columns} FROM ('
+            f'SELECT {columns}, ROW_NUMBER() OVER ('
+            f'PARTITION BY author_id ORDER BY id DESC) AS position '
+            f'FROM {table} '
+            f'WHERE author_id IN ({", ".join(["%s"] * len(author_ids))})'
+            f') ranked {position} ORDER BY author_id, position',
+            [*author_ids, *([] if limit is None else [limit])]
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -33,17 +65,56 @@ class Recipe(models.Model):
         validators=[MinValueValidator(MIN_COOKING_TIME)]
     )
     image = models.ImageField('Изображение', upload_to='recipes/')
+    image_variants = models.JSONField(
+        'Варианты изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
+    favorites_count = models.PositiveIntegerField('В избранном', default=0)
+    carts_count = models.PositiveIntegerField('В корзинах', default=0)
+    short_code = models.CharField(
+        'Короткий код',
+        max_length=SHORT_CODE_LENGTH,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False
+    )
+    clicks_count = models.PositiveIntegerField(
+        'Переходов по короткой ссылке',
+        default=0
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    counter_fields = ('favorites_count', 'carts_count', 'clicks_count')
 
     class Meta:
         ordering = ('name',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['name', 'id'], name='recipe_name_id_idx'),
+            models.Index(
+                fields=['author', '-id'], name='recipe_author_id_idx'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(CounterFieldsMixin, models.Model):
     name = models.CharField(
         'Название',
         max_length=MAX_INGREDIENT_NAME_LENGTH
@@ -53,6 +124,13 @@ class Ingredient(models.Model):
         'Единица измерения',
         max_length=MAX_MEASUREMENT_UNIT_LENGTH
     )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    recipes_count = models.PositiveIntegerField(
+        'Используется в рецептах',
+        default=0
+    )
+
+    counter_fields = ('recipes_count',)
 
     class Meta:
         ordering = ('name',)
@@ -153,3 +231,74 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f'У {self.user} в избранном лежит {self.recipe}'
+
+
+class CartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField('Общее количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент корзины'
+        verbose_name_plural = 'Ингредиенты корзин'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f'{self.user}: {self.ingredient.name} '
+            f'{self.total_amount} {self.ingredient.measurement_unit}'
+        )
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_item'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'], name='feed_user_author_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -0,0 +1,118 @@
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save
+)
+
+from tasks.queue import enqueue
+from users.models import Subscription
+from .cart_totals import change_user_totals, negate, recipe_amounts
+from .counters import COUNTERS, adjust
+from .feed import backfill, fan_out, trim
+from .images import needs_variants
+from .models import Cart, Recipe
+
+
+def connect_counter(model, field, source, relation):
+    attname = source._meta.get_field(relation).attname
+
+    def change(pk, delta):
+        if pk is not None:
+            adjust(model.objects.filter(pk=pk), field, delta)
+
+    def on_pre_save(sender, instance, raw=False, **kwargs):
+        if raw or instance._state.adding or instance.pk is None:
+            return
+        old = source.objects.filter(pk=instance.pk).values_list(
+            attname, flat=True
+        ).first()
+        new = getattr(instance, attname)
+        if old is not None and old != new:
+            change(old, -1)
+            change(new, 1)
+
+    def on_post_save(sender, instance, created, raw=False, **kwargs):
+        if created and not raw:
+            change(getattr(instance, attname), 1)
+
+    def on_post_delete(sender, instance, **kwargs):
+        change(getattr(instance, attname), -1)
+
+    uid = f'{model._meta.label}.{field}'
+    pre_save.connect(on_pre_save, sender=source, weak=False, dispatch_uid=uid)
+    post_save.connect(
+        on_post_save, sender=source, weak=False, dispatch_uid=uid
+    )
+    post_delete.connect(
+        on_post_delete, sender=source, weak=False, dispatch_uid=uid
+    )
+
+
+for counter in COUNTERS:
+    connect_counter(*counter)
+
+
+def add_to_cart_totals(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_user_totals(
+            instance.user_id, recipe_amounts(instance.recipe_id)
+        )
+
+
+def move_cart_totals(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    old = Cart.objects.filter(pk=instance.pk).values_list(
+        'user_id', 'recipe_id'
+    ).first()
+    if old is not None and old != (instance.user_id, instance.recipe_id):
+        change_user_totals(old[0], negate(recipe_amounts(old[1])))
+        change_user_totals(
+            instance.user_id, recipe_amounts(instance.recipe_id)
+        )
+
+
+# pre_delete: при каскадном удалении рецепта его ингредиенты ещё на месте.
+def remove_from_cart_totals(sender, instance, **kwargs):
+    change_user_totals(
+        instance.user_id, negate(recipe_amounts(instance.recipe_id))
+    )
+
+
+pre_save.connect(move_cart_totals, sender=Cart)
+post_save.connect(add_to_cart_totals, sender=Cart)
+pre_delete.connect(remove_from_cart_totals, sender=Cart)
+
+
+def fan_out_recipe(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fan_out(instance)
+
+
+def backfill_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        backfill(instance.subscriber_id, [instance.author_id])
+
+
+def trim_feed(sender, instance, **kwargs):
+    trim(instance.subscriber_id, [instance.author_id])
+
+
+post_save.connect(fan_out_recipe, sender=Recipe)
+post_save.connect(backfill_feed, sender=Subscription)
+post_delete.connect(trim_feed, sender=Subscription)
+
+
+# Задача ставится в той же транзакции: при откате не останется ни её,
+# ни файлов, а обработчик увидит её только после фиксации рецепта.
+def schedule_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw and needs_variants(instance):
+        enqueue(
+            'recipes.build_image_variants',
+            recipe_id=instance.pk,
+            name=instance.image.name
+        )
+
+
+post_save.connect(schedule_image_variants, sender=Recipe)
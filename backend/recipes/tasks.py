@@ -0,0 +1,17 @@
+from tasks.queue import task
+from .images import build_variants
+from .models import Recipe
+
+
+@task('recipes.build_image_variants')
+def build_image_variants(recipe_id, name):
+    """Строит уменьшенные копии изображения рецепта.
+
+    Если изображение успели заменить, задача ничего не делает: для нового
+    файла поставлена своя.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id, image=name).only(
+        'id', 'image', 'image_variants'
+    ).first()
+    if recipe is not None:
+        build_variants(recipe)
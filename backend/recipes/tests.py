@@ -0,0 +1,277 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+
+from tasks.models import Task
+from tasks.queue import claim, execute
+
+from users.models import Subscription, User
+from .cart_totals import change_recipe_totals, diff_amounts, recipe_amounts
+from .models import (
+    Cart,
+    CartIngredient,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient
+)
+
+TEMP_DIR = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+
+class RecipesFixtureMixin:
+    @classmethod
+    def create_objects(cls):
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(3)
+        )
+        cls.author, cls.user = (
+            User.objects.create_user(
+                username=username,
+                email=f'{username}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='password'
+            )
+            for username in ('author', 'reader')
+        )
+
+    def make_recipe(self, name='Рецепт', amounts=(100, 200), author=None):
+        recipe = Recipe.objects.create(
+            author=author or self.author,
+            name=name,
+            text='Описание',
+            cooking_time=10,
+            image='recipes/test.png'
+        )
+        for ingredient, amount in zip(self.ingredients, amounts):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        return recipe
+
+
+@override_settings(MEDIA_ROOT=TEMP_DIR)
+class RecipesTestCase(RecipesFixtureMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_objects()
+
+
+class CountersTest(RecipesTestCase):
+    def test_counters_follow_relations(self):
+        recipe = self.make_recipe()
+        favorite = Favorite.objects.create(user=self.user, recipe=recipe)
+        Cart.objects.create(user=self.user, recipe=recipe)
+        subscription = Subscription.objects.create(
+            subscriber=self.user, author=self.author
+        )
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.ingredients[0].refresh_from_db()
+        self.assertEqual((recipe.favorites_count, recipe.carts_count), (1, 1))
+        self.assertEqual(
+            (self.author.recipes_count, self.author.subscribers_count), (1, 1)
+        )
+        self.assertEqual(self.ingredients[0].recipes_count, 1)
+
+        favorite.delete()
+        subscription.delete()
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(self.author.subscribers_count, 0)
+
+    def test_saving_model_keeps_concurrent_counter(self):
+        recipe = self.make_recipe()
+        stale = Recipe.objects.get(pk=recipe.pk)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        stale.name = 'Новое название'
+        stale.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+
+    def test_rebuild_counters_repairs_drift(self):
+        recipe = self.make_recipe()
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=5)
+        User.objects.filter(pk=self.author.pk).update(recipes_count=0)
+
+        with self.assertRaisesMessage(
+            CommandError, 'Найдено расхождений: 2'
+        ) as error:
+            call_command('rebuild_counters', check=True, stdout=StringIO())
+        self.assertEqual(error.exception.returncode, 1)
+        call_command('rebuild_counters', stdout=StringIO())
+        call_command('rebuild_counters', check=True, stdout=StringIO())
+
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+
+
+def edit_recipe(recipe, amounts):
+    """Меняет количества ингредиентов рецепта, как это делает сериализатор."""
+    old = recipe_amounts(recipe.pk)
+    for ingredient_id, amount in amounts.items():
+        RecipeIngredient.objects.update_or_create(
+            recipe=recipe,
+            ingredient_id=ingredient_id,
+            defaults={'amount': amount}
+        )
+    change_recipe_totals(recipe.pk, diff_amounts(old, recipe_amounts(
+        recipe.pk
+    )))
+
+
+class CartTotalsTest(RecipesTestCase):
+    def totals(self, user=None):
+        return dict(CartIngredient.objects.filter(
+            user=user or self.user
+        ).values_list('ingredient__name', 'total_amount'))
+
+    def test_cart_changes_adjust_totals(self):
+        soup = self.make_recipe(amounts=(100, 200))
+        salad = self.make_recipe(amounts=(50,))
+        Cart.objects.create(user=self.user, recipe=soup)
+        cart = Cart.objects.create(user=self.user, recipe=salad)
+        self.assertEqual(
+            self.totals(), {'Ингредиент 0': 150, 'Ингредиент 1': 200}
+        )
+        cart.delete()
+        self.assertEqual(
+            self.totals(), {'Ингредиент 0': 100, 'Ингредиент 1': 200}
+        )
+
+    def test_recipe_edit_reaches_every_cart(self):
+        recipe = self.make_recipe(amounts=(100,))
+        Cart.objects.create(user=self.user, recipe=recipe)
+        Cart.objects.create(user=self.author, recipe=recipe)
+        first, _, third = self.ingredients
+        edit_recipe(recipe, {first.pk: 30, third.pk: 5})
+        for user in (self.user, self.author):
+            self.assertEqual(
+                self.totals(user), {'Ингредиент 0': 30, 'Ингредиент 2': 5}
+            )
+
+    def test_rebuild_cart_totals_repairs_drift(self):
+        Cart.objects.create(user=self.user, recipe=self.make_recipe())
+        CartIngredient.objects.filter(user=self.user).update(total_amount=1)
+        with self.assertRaisesMessage(
+            CommandError, 'Найдено расхождений: 2'
+        ) as error:
+            call_command(
+                'rebuild_cart_totals', check=True, stdout=StringIO()
+            )
+        self.assertEqual(error.exception.returncode, 1)
+        call_command('rebuild_cart_totals', stdout=StringIO())
+        self.assertEqual(
+            self.totals(), {'Ингредиент 0': 100, 'Ингредиент 1': 200}
+        )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+@override_settings(MEDIA_ROOT=TEMP_DIR)
+class CartTotalsLockTest(RecipesFixtureMixin, TransactionTestCase):
+    def test_recipe_edit_locks_cart_owners(self):
+        self.create_objects()
+        recipe = self.make_recipe(amounts=(100,))
+        Cart.objects.create(user=self.user, recipe=recipe)
+        errors = []
+
+        def add_to_cart_concurrently():
+            try:
+                with transaction.atomic():
+                    User.objects.select_for_update(nowait=True).get(
+                        pk=self.user.pk
+                    )
+            except DatabaseError as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        with transaction.atomic():
+            edit_recipe(recipe, {self.ingredients[1].pk: 10})
+            thread = threading.Thread(target=add_to_cart_concurrently)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(errors), 1)
+
+
+def image_file(name='photo.png', size=(640, 400)):
+    output = io.BytesIO()
+    Image.new('RGB', size, 'orange').save(output, 'PNG')
+    return SimpleUploadedFile(name, output.getvalue(), 'image/png')
+
+
+def variant_files():
+    directory = os.path.join(TEMP_DIR, 'recipes', 'variants')
+    return os.listdir(directory) if os.path.isdir(directory) else []
+
+
+class ImageVariantsTest(RecipesTestCase):
+    def setUp(self):
+        super().setUp()
+        shutil.rmtree(os.path.join(TEMP_DIR, 'recipes'), ignore_errors=True)
+
+    def create_recipe(self):
+        return Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            text='Описание',
+            cooking_time=10,
+            image=image_file()
+        )
+
+    def run_tasks(self):
+        while (claimed := claim()) is not None:
+            self.assertTrue(execute(claimed))
+
+    def test_variants_are_built_by_queued_task(self):
+        recipe = self.create_recipe()
+        self.assertEqual(variant_files(), [])
+        task = Task.objects.get()
+        self.assertEqual(task.payload, {
+            'recipe_id': recipe.pk, 'name': recipe.image.name
+        })
+        self.run_tasks()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants['source'], recipe.image.name)
+        self.assertEqual(recipe.image_variants['card']['width'], 480)
+        self.assertEqual(len(variant_files()), 6)
+        recipe.name = 'Новое название'
+        recipe.save()
+        self.assertFalse(Task.objects.exists())
+
+    def test_rolled_back_recipe_leaves_no_task_or_files(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.create_recipe()
+            raise RuntimeError
+        self.assertFalse(Task.objects.exists())
+        self.assertEqual(variant_files(), [])
+
+    def test_task_for_replaced_image_does_nothing(self):
+        recipe = self.create_recipe()
+        recipe.image = image_file('other.png')
+        recipe.save()
+        self.assertEqual(Task.objects.count(), 2)
+        self.run_tasks()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants['source'], recipe.image.name)
+        self.assertEqual(len(variant_files()), 6)
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'available_at', 'created_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('attempts', 'last_error', 'created_at')
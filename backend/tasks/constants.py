@@ -0,0 +1,8 @@
+MAX_TASK_NAME_LENGTH = 100
+MAX_TASK_STATUS_LENGTH = 20
+
+TASK_MAX_ATTEMPTS = 5
+TASK_VISIBILITY_TIMEOUT = 5 * 60
+TASK_RETRY_BASE_DELAY = 10
+TASK_RETRY_MAX_DELAY = 60 * 60
+TASK_POLL_INTERVAL = 1.0
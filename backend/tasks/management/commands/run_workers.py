@@ -0,0 +1,67 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from tasks.constants import TASK_POLL_INTERVAL, TASK_VISIBILITY_TIMEOUT
+from tasks.queue import claim, execute
+
+
+class Command(BaseCommand):
+    help = 'Запускает обработчики фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Число потоков-обработчиков'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=TASK_POLL_INTERVAL,
+            help='Пауза между опросами пустой очереди, секунд'
+        )
+        parser.add_argument(
+            '--visibility-timeout',
+            type=int,
+            default=TASK_VISIBILITY_TIMEOUT,
+            help='Через сколько секунд незавершённая задача снова доступна'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Выйти, когда очередь опустеет'
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *_: self.stop.set())
+        workers = [
+            threading.Thread(target=self.work, args=(options,))
+            for _ in range(max(1, options['concurrency']))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def work(self, options):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                claimed = claim(options['visibility_timeout'])
+                if claimed is None:
+                    if options['burst']:
+                        return
+                    self.stop.wait(options['poll_interval'])
+                elif not execute(claimed):
+                    self.stderr.write(
+                        f'{claimed}: ошибка, попытка {claimed.attempts}'
+                    )
+        finally:
+            connection.close()
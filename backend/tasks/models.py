@@ -0,0 +1,54 @@
+from django.db import models
+from django.utils import timezone
+
+from .constants import (
+    MAX_TASK_NAME_LENGTH,
+    MAX_TASK_STATUS_LENGTH,
+    TASK_MAX_ATTEMPTS
+)
+
+
+class Task(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=MAX_TASK_NAME_LENGTH)
+    payload = models.JSONField('Аргументы', default=dict, blank=True)
+    status = models.CharField(
+        'Состояние',
+        max_length=MAX_TASK_STATUS_LENGTH,
+        choices=STATUSES,
+        default=PENDING
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveIntegerField(
+        'Максимум попыток',
+        default=TASK_MAX_ATTEMPTS
+    )
+    available_at = models.DateTimeField(
+        'Доступна с',
+        default=timezone.now
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        ordering = ('available_at', 'id')
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(status__in=['pending', 'running']),
+                name='task_available_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
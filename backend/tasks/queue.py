@@ -0,0 +1,99 @@
+"""Очередь фоновых задач в таблице `Task`.
+
+Задача ставится обычной вставкой, поэтому становится видна обработчикам
+только после фиксации транзакции, которая её создала. Обработчик забирает
+задачу через `SELECT ... FOR UPDATE SKIP LOCKED` и продлевает
+`available_at` на время видимости: если процесс упадёт, задача снова
+станет доступной по истечении этого времени. Задачи должны быть
+идемпотентными — одна и та же задача может выполниться дважды.
+"""
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .constants import (
+    TASK_RETRY_BASE_DELAY,
+    TASK_RETRY_MAX_DELAY,
+    TASK_VISIBILITY_TIMEOUT
+)
+from .models import Task
+
+LOST_TASK_ERROR = 'Обработчик не завершил последнюю попытку'
+
+registry = {}
+
+
+def task(name):
+    def register(func):
+        registry[name] = func
+        return func
+    return register
+
+
+def enqueue(name, /, **payload):
+    if name not in registry:
+        raise KeyError(f'Неизвестная задача: {name}')
+    return Task.objects.create(name=name, payload=payload)
+
+
+def claim(visibility_timeout=TASK_VISIBILITY_TIMEOUT):
+    """Забирает ближайшую доступную задачу и засчитывает попытку.
+
+    Попытка считается при выдаче, а не при ошибке: если обработчик
+    падает вместе с процессом, задача с исчерпанными попытками больше
+    не выдаётся, а помечается как ошибочная.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        available = Task.objects.filter(
+            status__in=(Task.PENDING, Task.RUNNING),
+            available_at__lte=now
+        )
+        available.filter(attempts__gte=F('max_attempts')).update(
+            status=Task.FAILED, last_error=LOST_TASK_ERROR
+        )
+        claimed = available.select_for_update(skip_locked=True).filter(
+            attempts__lt=F('max_attempts')
+        ).order_by('available_at', 'id').first()
+        if claimed is None:
+            return None
+        claimed.status = Task.RUNNING
+        claimed.attempts += 1
+        claimed.available_at = now + timedelta(seconds=visibility_timeout)
+        claimed.save(update_fields=('status', 'attempts', 'available_at'))
+    return claimed
+
+
+def retry_delay(attempts):
+    return min(
+        TASK_RETRY_BASE_DELAY * 2 ** (attempts - 1), TASK_RETRY_MAX_DELAY
+    )
+
+
+def execute(claimed):
+    """Выполняет задачу; возвращает False, если она завершилась ошибкой."""
+    # Строка совпадает с этим запуском, только пока её не забрал заново
+    # другой обработчик после истечения времени видимости.
+    current = Task.objects.filter(pk=claimed.pk, attempts=claimed.attempts)
+    try:
+        registry[claimed.name](**claimed.payload)
+    except Exception:
+        if claimed.attempts >= claimed.max_attempts:
+            current.update(
+                status=Task.FAILED, last_error=traceback.format_exc()
+            )
+        else:
+            current.update(
+                status=Task.PENDING,
+                available_at=timezone.now() + timedelta(
+                    seconds=retry_delay(claimed.attempts)
+                ),
+                last_error=traceback.format_exc()
+            )
+        return False
+    current.delete()
+    return True
+
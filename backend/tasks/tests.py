@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from .models import Task
+from .queue import LOST_TASK_ERROR, claim, enqueue, execute, task
+
+calls = []
+
+
+@task('tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task('tests.fail')
+def fail():
+    raise ValueError('сбой')
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def make_available(self):
+        Task.objects.update(available_at=timezone.now())
+
+    def test_successful_task_is_deleted(self):
+        enqueue('tests.record', value=1)
+        claimed = claim()
+        self.assertEqual((claimed.status, claimed.attempts), (Task.RUNNING, 1))
+        self.assertIsNone(claim())
+        self.assertTrue(execute(claimed))
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failing_task_is_retried_then_failed(self):
+        enqueue('tests.fail')
+        Task.objects.update(max_attempts=2)
+        self.assertFalse(execute(claim()))
+        failed = Task.objects.get()
+        self.assertEqual(failed.status, Task.PENDING)
+        self.assertGreater(failed.available_at, timezone.now())
+        self.assertIn('ValueError', failed.last_error)
+        self.make_available()
+        self.assertFalse(execute(claim()))
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+        self.assertIsNone(claim())
+
+    def test_crashed_worker_does_not_loop_forever(self):
+        enqueue('tests.record', value=1)
+        Task.objects.update(max_attempts=3)
+        # Обработчик забирает задачу и падает, не вызвав execute.
+        for attempt in range(1, 4):
+            claimed = claim(visibility_timeout=0)
+            self.assertEqual(claimed.attempts, attempt)
+            self.make_available()
+        self.assertIsNone(claim())
+        lost = Task.objects.get()
+        self.assertEqual(lost.status, Task.FAILED)
+        self.assertEqual(lost.last_error, LOST_TASK_ERROR)
+        self.assertEqual(calls, [])
+
+    def test_stale_worker_does_not_touch_reclaimed_task(self):
+        enqueue('tests.record', value=1)
+        stale = claim(visibility_timeout=0)
+        Task.objects.update(available_at=timezone.now() - timedelta(1))
+        fresh = claim()
+        self.assertTrue(execute(stale))
+        self.assertTrue(Task.objects.filter(pk=fresh.pk).exists())
+        self.assertTrue(execute(fresh))
+        self.assertFalse(Task.objects.exists())
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(KeyError):
+            enqueue('tests.missing')
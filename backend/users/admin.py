@@ -8,7 +8,9 @@ class AdminUser(UserAdmin):
     list_display = ('username',
                     'first_name',
                     'email',
-                    'is_staff')
+                    'is_staff',
+                    'recipes_count',
+                    'subscribers_count')
 
     ordering = ('email',)
 
@@ -4,3 +4,6 @@ USERNAME_MAX_LENGTH = 100
 FIRST_NAME_MAX_LENGTH = 100
 LAST_NAME_MAX_LENGTH = 100
 EMAIL_MAX_LENGTH = 100
+
+AVATAR_SIZE = 256
+AVATAR_QUALITY = 85
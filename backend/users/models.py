@@ -12,7 +12,26 @@ from .constants import (
 )
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            self.counter_fields
+            and not self._state.adding
+            and kwargs.get('update_fields') is None
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     username_validator = RegexValidator(
         regex=USERNAME_REGEX,
         message=(
@@ -45,8 +64,12 @@ class User(AbstractUser):
         max_length=EMAIL_MAX_LENGTH,
         unique=True
     )
+    updated_at = models.DateTimeField('Дата изменения', auto_now=True)
+    recipes_count = models.PositiveIntegerField('Рецептов', default=0)
+    subscribers_count = models.PositiveIntegerField('Подписчиков', default=0)
 
     REQUIRED_FIELDS = ['email', 'first_name', 'last_name']
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -0,0 +1,43 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from tasks.queue import task
+from .constants import AVATAR_QUALITY, AVATAR_SIZE
+from .models import User
+
+
+def normalize_avatar(source):
+    with Image.open(io.BytesIO(source)) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    image = ImageOps.fit(image, (AVATAR_SIZE, AVATAR_SIZE), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=AVATAR_QUALITY, optimize=True)
+    return output.getvalue()
+
+
+@task('users.process_avatar')
+def process_avatar(user_id, name):
+    """Заменяет загруженный аватар квадратной копией в JPEG.
+
+    Если пользователь успел сменить или удалить аватар, результат
+    выбрасывается, так что повторный запуск задачи безопасен.
+    """
+    if not User.objects.filter(pk=user_id, avatar=name).exists():
+        return
+    with default_storage.open(name, 'rb') as file:
+        content = normalize_avatar(file.read())
+    stem = os.path.splitext(os.path.basename(name))[0]
+    processed = default_storage.save(
+        f'avatars/{stem}-{AVATAR_SIZE}.jpg', ContentFile(content)
+    )
+    if User.objects.filter(pk=user_id, avatar=name).update(
+        avatar=processed, updated_at=timezone.now()
+    ):
+        default_storage.delete(name)
+    else:
+        default_storage.delete(processed)